@@ -0,0 +1,81 @@
+"""
+Per-profile parse time microbenchmark
+Times tree construction and field extraction separately for every fixture,
+comparing legacy extraction (each extractor rescans the document) with the
+single-pass _DocumentIndex engine.
+
+Usage:
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --parser html.parser --iterations 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sb import CodeChefScraper, HTML_PARSER, _DocumentIndex  # noqa: E402
+from stub_server import load_fixtures  # noqa: E402
+
+
+def extract(scraper, soup, html, username):
+    index = _DocumentIndex(soup) if scraper.single_pass else None
+    scraper._extract_main_stats(soup, html, index)
+    scraper._get_full_name(soup, username, index)
+    scraper._get_stars(soup, index)
+    scraper._get_problems_solved(html, soup, index)
+    scraper._extract_contest_details(soup, index)
+
+
+def best_of(fn, iterations, repeats=5):
+    """Best mean over several repeats, in milliseconds (least noisy estimate)."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        mean = (time.perf_counter() - start) / iterations * 1000
+        best = mean if best is None else min(best, mean)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-profile parse time, legacy vs single-pass")
+    parser.add_argument("--parser", default=HTML_PARSER, help="BeautifulSoup tree builder")
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    legacy = CodeChefScraper(parser=args.parser, single_pass=False)
+    single = CodeChefScraper(parser=args.parser, single_pass=True)
+
+    print("=" * 78)
+    print(f"Parser: {args.parser}   iterations: {args.iterations} (best of 5)")
+    print("=" * 78)
+    print(f"{'Fixture':<16} {'build ms':>10} {'legacy ms':>11} {'single ms':>11} {'speedup':>9} {'total ms':>10}")
+    print("-" * 78)
+
+    totals = [0.0, 0.0, 0.0]
+    for name, body in sorted(pages.items()):
+        html = body.decode("utf-8")
+        soup = legacy._make_soup(html)
+        build = best_of(lambda: legacy._make_soup(html), args.iterations)
+        before = best_of(lambda: extract(legacy, soup, html, name), args.iterations)
+        after = best_of(lambda: extract(single, soup, html, name), args.iterations)
+        totals[0] += build
+        totals[1] += before
+        totals[2] += after
+        print(f"{name:<16} {build:>10.2f} {before:>11.2f} {after:>11.2f} "
+              f"{before / after:>8.1f}x {build + after:>10.2f}")
+
+    print("-" * 78)
+    build, before, after = totals
+    print(f"{'corpus':<16} {build:>10.2f} {before:>11.2f} {after:>11.2f} "
+          f"{before / after:>8.1f}x {build + after:>10.2f}")
+    print(f"\nPer-profile parse (build + extract): {build + before:.2f} ms -> {build + after:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Cold vs warm lookup latency benchmark
+Compares a fresh CodeChefScraper per lookup (new session, new connection)
+against the shared SessionRegistry scraper (pooled keep-alive connection).
+
+Usage:
+    python benchmarks/bench_session.py                 # local stub server
+    python benchmarks/bench_session.py --latency 0.02  # simulate upstream think time
+    python benchmarks/bench_session.py --base-url https://stub.example  # any https stub
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sb import CodeChefScraper, SessionRegistry  # noqa: E402
+from stub_server import start_stub_server  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_calls(make_scraper, username, iterations, fetch_only):
+    times = []
+    for _ in range(iterations):
+        scraper = make_scraper()
+        start = time.perf_counter()
+        if fetch_only:
+            response = scraper.session.get(f"{scraper.base_url}/users/{username}", timeout=30)
+            response.content
+        else:
+            scraper.get_user_data(username)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report(label, times):
+    print(f"  {label:<6} mean {statistics.mean(times):8.2f} ms   "
+          f"p50 {percentile(times, 50):8.2f} ms   p95 {percentile(times, 95):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold vs warm CodeChef lookup latency")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub response delay in seconds")
+    parser.add_argument("--base-url", help="Benchmark against this server instead of the local stub")
+    parser.add_argument("--username", default="rated")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_stub_server(latency=args.latency)
+
+    registry = SessionRegistry(base_url=base_url)
+
+    def cold():
+        return CodeChefScraper(skip_rate_limit=True, base_url=base_url)
+
+    def warm():
+        return registry.get_scraper(skip_rate_limit=True)
+
+    # Prime the shared session so every warm call finds an open connection
+    warm().session.get(f"{base_url}/users/{args.username}", timeout=30).content
+
+    print("=" * 70)
+    print(f"Target: {base_url}   iterations: {args.iterations}")
+    print("=" * 70)
+    for fetch_only, title in ((True, "Fetch only (connection + transfer)"),
+                              (False, "Full lookup (fetch + parse)")):
+        print(f"\n{title}")
+        cold_times = time_calls(cold, args.username, args.iterations, fetch_only)
+        warm_times = time_calls(warm, args.username, args.iterations, fetch_only)
+        report("cold", cold_times)
+        report("warm", warm_times)
+        saved = statistics.mean(cold_times) - statistics.mean(warm_times)
+        print(f"  warm saves {saved:.2f} ms per lookup on average")
+
+    print(f"\nSessions created by registry: {registry.sessions_created}")
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Offline benchmark suite
+Runs entirely against the local stub server and the fixture corpus, so the
+numbers are repeatable and need no network access:
+
+  1. parse time per profile for every fixture page
+  2. /api/codechef throughput and latency, for cache misses and cache hits
+  3. /api/codechef/bulk throughput and latency per batch
+
+Every section reports mean and p50/p95/p99 so performance regressions show up
+as numbers rather than impressions.
+
+Usage:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --latency 0.05 --requests 200 --concurrency 8
+    python benchmarks/bench_suite.py --rate-limit-prob 0.05 --json results.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stub_server import NOT_FOUND_PAGE, load_fixtures, start_stub_server  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies_ms, elapsed=None, errors=0):
+    """Mean and tail latencies (ms), plus throughput when the wall time is known."""
+    summary = {
+        "count": len(latencies_ms),
+        "mean_ms": round(statistics.mean(latencies_ms), 2),
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms), 2),
+        "errors": errors,
+    }
+    if elapsed:
+        summary["per_second"] = round(len(latencies_ms) / elapsed, 1)
+    return summary
+
+
+def report(label, summary, unit="req/s"):
+    rate = f"{summary['per_second']:>9.1f} {unit}" if "per_second" in summary else ""
+    print(f"  {label:<22} mean {summary['mean_ms']:>8.2f}  p50 {summary['p50_ms']:>8.2f}  "
+          f"p95 {summary['p95_ms']:>8.2f}  p99 {summary['p99_ms']:>8.2f} ms  {rate}"
+          + (f"  ❌ {summary['errors']} error(s)" if summary["errors"] else ""))
+
+
+@contextlib.contextmanager
+def quiet(enabled):
+    """Silence the service's per-request logging while load runs."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def bench_parse(sb, pages, iterations):
+    """Full parse_profile pipeline per fixture, as the running service is configured."""
+    scraper = sb.CodeChefScraper(skip_rate_limit=True)
+    results = {}
+    for name, body in sorted(pages.items()):
+        html = body.decode("utf-8")
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            scraper.parse_profile(html, name)
+            times.append((time.perf_counter() - start) * 1000)
+        results[name] = summarize(times)
+        results[name]["kb"] = round(len(body) / 1024, 1)
+    return results
+
+
+def run_load(call, jobs, concurrency):
+    """Run ``call(job)`` for every job on ``concurrency`` threads. Returns (latencies_ms, elapsed, errors)."""
+    local = threading.local()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(job):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        ok = call(session, job)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, jobs))
+    return latencies, time.perf_counter() - start, errors[0]
+
+
+def bench_single(app_url, usernames, concurrency, refresh):
+    def call(session, username):
+        params = {"username": username}
+        if refresh:
+            params["refresh"] = "1"
+        response = session.get(f"{app_url}/api/codechef", params=params, timeout=120)
+        return response.status_code == 200 and response.json().get("success", False)
+
+    return summarize(*run_load(call, usernames, concurrency))
+
+
+def bench_bulk(app_url, batches, concurrency):
+    profiles = [0]
+    lock = threading.Lock()
+
+    def call(session, batch):
+        response = session.post(f"{app_url}/api/codechef/bulk", json={"usernames": batch}, timeout=600)
+        if response.status_code != 200:
+            return False
+        summary = response.json()["summary"]
+        with lock:
+            profiles[0] += summary["total"]
+        return summary["failed"] == 0
+
+    latencies, elapsed, errors = run_load(call, batches, concurrency)
+    summary = summarize(latencies, elapsed, errors)
+    summary["profiles_per_second"] = round(profiles[0] / elapsed, 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline parse, single-lookup and bulk benchmarks")
+    parser.add_argument("--iterations", type=int, default=20, help="Parse timings per fixture")
+    parser.add_argument("--requests", type=int, default=100, help="Single lookups per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--batches", type=int, default=5, help="Bulk requests to send")
+    parser.add_argument("--batch-size", type=int, default=20, help="Usernames per bulk request")
+    parser.add_argument("--rps", type=float, default=0.0,
+                        help="Upstream rate limit for the service under test (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub response delay in seconds")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="Fraction of stub responses that are 429")
+    parser.add_argument("--timeout-prob", type=float, default=0.0, help="Fraction of stub requests that hang")
+    parser.add_argument("--hang", type=float, default=35.0, help="Seconds a hung stub request stalls")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for injected failures")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's own logging")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, rate_limit_prob=args.rate_limit_prob,
+                                         timeout_prob=args.timeout_prob, hang=args.hang, seed=args.seed)
+    scratch = tempfile.mkdtemp(prefix="codechef-bench-")
+    # The service reads its configuration at import: point it at the stub, keep state out of the repo
+    os.environ.update({
+        "CODECHEF_BASE_URL": base_url,
+        "CODECHEF_STORE_DB": "",
+        "CODECHEF_RATE_LIMIT_DB": "",
+        "CODECHEF_RATE_LIMIT_RPS": str(args.rps),
+        "CODECHEF_JOBS_DB": os.path.join(scratch, "bulk_jobs.sqlite3"),
+        "CODECHEF_METRICS_DB": "",
+    })
+    import sb  # noqa: E402
+    from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+    verbose = args.verbose
+
+    class RequestHandler(WSGIRequestHandler):
+        def log_request(self, *log_args, **kwargs):
+            if verbose:
+                super().log_request(*log_args, **kwargs)
+
+    app_server = make_server("127.0.0.1", 0, sb.app, threaded=True, request_handler=RequestHandler)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    app_url = f"http://127.0.0.1:{app_server.server_port}"
+
+    pages = load_fixtures()
+    profile_pages = sorted(name for name in pages if name != NOT_FOUND_PAGE)
+    results = {"config": vars(args)}
+
+    print("=" * 100)
+    print(f"Stub: {base_url}  latency {args.latency}s  429 prob {args.rate_limit_prob}  "
+          f"timeout prob {args.timeout_prob}   parser: {sb.HTML_PARSER}")
+    print("=" * 100)
+
+    print(f"\nParse time per profile ({args.iterations} iterations)")
+    results["parse"] = bench_parse(sb, pages, args.iterations)
+    for name, summary in results["parse"].items():
+        report(f"{name} ({summary['kb']} KB)", summary)
+
+    print(f"\n/api/codechef ({args.requests} requests, {args.concurrency} clients)")
+    # Distinct handles cycling through the corpus (<fixture>--<n> serves that fixture), so
+    # misses are never coalesced and every page type is exercised
+    usernames = [f"{profile_pages[i % len(profile_pages)]}--{i}" for i in range(args.requests)]
+    with quiet(not args.verbose):
+        results["single_miss"] = bench_single(app_url, usernames, args.concurrency, refresh=True)
+        results["single_hit"] = bench_single(app_url, usernames, args.concurrency, refresh=False)
+    report("cache miss (refresh=1)", results["single_miss"])
+    report("cache hit", results["single_hit"])
+
+    print(f"\n/api/codechef/bulk ({args.batches} batches of {args.batch_size}, {args.concurrency} clients)")
+    # Handles not used above, so every bulk item is a real fetch
+    batches = [[f"{profile_pages[i % len(profile_pages)]}--bulk{b}x{i}" for i in range(args.batch_size)]
+               for b in range(args.batches)]
+    with quiet(not args.verbose):
+        results["bulk"] = bench_bulk(app_url, batches, args.concurrency)
+    report("per batch", results["bulk"], unit="batch/s")
+    print(f"  {'throughput':<22} {results['bulk']['profiles_per_second']:.1f} profiles/s")
+
+    results["upstream"] = {
+        "requests": server.request_count,
+        "rate_limits_injected": server.rate_limits_injected,
+        "timeouts_injected": server.timeouts_injected,
+    }
+    print(f"\nStub served {server.request_count} request(s); injected {server.rate_limits_injected} 429(s) "
+          f"and {server.timeouts_injected} timeout(s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Results written to {args.json}")
+
+    app_server.shutdown()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+Load-testing harness
+Runs the service as it is deployed (gunicorn workers, or the threaded dev
+server when gunicorn is unavailable) against the local stub upstream, and
+sweeps the deployment shape:
+
+  - server worker count (gunicorn -w)
+  - client concurrency against /api/codechef
+  - bulk batch size against /api/codechef/bulk
+
+Each point runs closed-loop clients for a fixed duration and records
+throughput, latency percentiles, error rate and the RSS of every server
+process (sampled from /proc while the load runs). The full sweep is written
+as a JSON report; pass a previous report as --baseline to fail on regressions.
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --workers 1,2,4 --concurrency 1,4,16 --batch-sizes 10,50
+    python benchmarks/load_test.py --latency 0.2 --duration 20 --report load.json
+    python benchmarks/load_test.py --baseline load.json --tolerance 0.15
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+from bench_suite import summarize  # noqa: E402
+from stub_server import NOT_FOUND_PAGE, load_fixtures, start_stub_server  # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+DEV_SERVER = ("from werkzeug.serving import run_simple; import sb; "
+              "run_simple('127.0.0.1', {port}, sb.app, threaded=True)")
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ---------------------------------------------------------------------------
+# Process memory (Linux /proc)
+# ---------------------------------------------------------------------------
+
+def rss_kb(pid):
+    """Resident set size of ``pid`` in KiB, or None if it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_tree(root):
+    """``root`` and all of its descendants (gunicorn master plus workers)."""
+    parents = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid is the second field after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(parents.get(pid, []))
+    return tree
+
+
+class RssSampler:
+    """Samples the RSS of a server's process tree in the background, keeping the peak per process."""
+
+    def __init__(self, root, interval=0.25):
+        self.root = root
+        self.interval = interval
+        self.peak = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        for pid in process_tree(self.root):
+            value = rss_kb(pid)
+            if value is not None:
+                self.peak[pid] = max(value, self.peak.get(pid, 0))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.peak = {}
+        self._stop.clear()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def summary(self):
+        """Peak RSS per process plus totals; the gunicorn master is reported separately from its workers."""
+        if not self.peak:
+            return None
+        workers = {pid: kb for pid, kb in self.peak.items() if pid != self.root} or dict(self.peak)
+        return {
+            "master_kb": self.peak.get(self.root) if len(self.peak) > 1 else None,
+            "workers": len(workers),
+            "worker_peak_kb": max(workers.values()),
+            "worker_mean_kb": round(sum(workers.values()) / len(workers)),
+            "total_kb": sum(self.peak.values()),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Service under test
+# ---------------------------------------------------------------------------
+
+class ServiceProcess:
+    """sb.py in its own process (so its memory is measurable), pointed at the stub upstream."""
+
+    def __init__(self, server, workers, threads, stub_url, rps, scratch):
+        self.server = server
+        self.workers = workers
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(scratch, f"{server}-w{workers}.log")
+        # Same layout as a deployment: workers share the rate-limit file and job store
+        self.env = dict(os.environ,
+                        CODECHEF_BASE_URL=stub_url,
+                        CODECHEF_STORE_DB="",
+                        CODECHEF_RATE_LIMIT_DB=os.path.join(scratch, f"ratelimit-w{workers}.sqlite3"),
+                        CODECHEF_RATE_LIMIT_RPS=str(rps),
+                        CODECHEF_JOBS_DB=os.path.join(scratch, f"bulk_jobs-w{workers}.sqlite3"),
+                        CODECHEF_METRICS_DB=os.path.join(scratch, f"metrics-w{workers}.sqlite3"))
+        if server == "gunicorn":
+            self.command = [sys.executable, "-m", "gunicorn", "sb:app", "--bind", f"127.0.0.1:{self.port}",
+                            "--workers", str(workers), "--threads", str(threads), "--timeout", "600"]
+        else:
+            self.command = [sys.executable, "-c", DEV_SERVER.format(port=self.port)]
+        self.process = None
+        self._log = None
+
+    def start(self, timeout=30):
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(self.command, cwd=SERVICE_DIR, env=self.env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.server} exited with {self.process.returncode}; see {self.log_path}")
+            try:
+                if requests.get(f"{self.url}/api/codechef/health", timeout=2).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.server} did not become healthy within {timeout}s; see {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._log:
+            self._log.close()
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def closed_loop(call, concurrency, duration):
+    """``concurrency`` clients each issue ``call(session)`` back to back for ``duration`` seconds.
+
+    Returns (latencies_ms, elapsed, errors, items) where ``items`` sums what each call reports
+    (profiles for bulk, 1 per lookup).
+    """
+    latencies = []
+    totals = {"errors": 0, "items": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                ok, items = call(session)
+            except (requests.RequestException, ValueError, KeyError):
+                ok, items = False, 0
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                totals["items"] += items
+                if not ok:
+                    totals["errors"] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, totals["errors"], totals["items"]
+
+
+def handles(profile_pages, prefix):
+    """Endless distinct usernames cycling through the fixture corpus, so misses are never coalesced."""
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def next_handle():
+        with lock:
+            n = next(counter)
+        return f"{profile_pages[n % len(profile_pages)]}--{prefix}{n}"
+
+    return next_handle
+
+
+def single_call(url, next_handle):
+    def call(session):
+        response = session.get(f"{url}/api/codechef", params={"username": next_handle(), "refresh": "1"},
+                               timeout=120)
+        return response.status_code == 200 and response.json().get("success", False), 1
+
+    return call
+
+
+def bulk_call(url, next_handle, batch_size):
+    def call(session):
+        batch = [next_handle() for _ in range(batch_size)]
+        response = session.post(f"{url}/api/codechef/bulk", json={"usernames": batch}, timeout=600)
+        if response.status_code != 200:
+            return False, 0
+        summary = response.json()["summary"]
+        return summary["failed"] == 0, summary["total"]
+
+    return call
+
+
+def run_point(service, scenario, call, concurrency, duration, extra=None):
+    with RssSampler(service.process.pid) as sampler:
+        latencies, elapsed, errors, items = closed_loop(call, concurrency, duration)
+    point = {"scenario": scenario, "workers": service.workers, "concurrency": concurrency}
+    point.update(extra or {})
+    if latencies:
+        point.update(summarize(latencies, elapsed, errors))
+    else:
+        point.update({"count": 0, "errors": 0})
+    point["error_rate"] = round(errors / len(latencies), 4) if latencies else None
+    point["items_per_second"] = round(items / elapsed, 1)
+    point["rss"] = sampler.summary()
+    return point
+
+
+def report_point(point):
+    rss = point["rss"]
+    memory = f"rss/worker {rss['worker_peak_kb'] / 1024:6.1f} MiB" if rss else "rss n/a"
+    shape = f"w{point['workers']} c{point['concurrency']}"
+    if "batch_size" in point:
+        shape += f" b{point['batch_size']}"
+    latency = (f"p50 {point['p50_ms']:>8.1f}  p95 {point['p95_ms']:>8.1f}  p99 {point['p99_ms']:>8.1f} ms"
+               if point["count"] else "no completed requests")
+    errors = f"  ❌ {point['error_rate']:.1%} errors" if point["errors"] else ""
+    print(f"  {point['scenario']:<7} {shape:<14} {point['items_per_second']:>8.1f} profiles/s  "
+          f"{latency}  {memory}{errors}")
+
+
+# ---------------------------------------------------------------------------
+# Regression check
+# ---------------------------------------------------------------------------
+
+def point_key(point):
+    return (point["scenario"], point["workers"], point["concurrency"], point.get("batch_size"))
+
+
+def compare(points, baseline, tolerance):
+    """Points whose throughput fell, or whose p95 or error rate rose, by more than ``tolerance``."""
+    previous = {point_key(point): point for point in baseline.get("points", [])}
+    regressions = []
+    for point in points:
+        before = previous.get(point_key(point))
+        if not before or not before.get("count") or not point.get("count"):
+            continue
+        if point["items_per_second"] < before["items_per_second"] * (1 - tolerance):
+            regressions.append((point, "throughput", before["items_per_second"], point["items_per_second"]))
+        if point["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append((point, "p95_ms", before["p95_ms"], point["p95_ms"]))
+        if point["error_rate"] > (before["error_rate"] or 0) + tolerance / 10:
+            regressions.append((point, "error_rate", before["error_rate"], point["error_rate"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep worker count, concurrency and bulk batch size")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "dev"], default="auto",
+                        help="How to run sb.py (auto = gunicorn when installed)")
+    parser.add_argument("--workers", type=parse_list, default=[1, 2, 4], help="gunicorn worker counts to sweep")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per gunicorn worker")
+    parser.add_argument("--concurrency", type=parse_list, default=[1, 4, 16],
+                        help="Concurrent clients to sweep for single lookups")
+    parser.add_argument("--batch-sizes", type=parse_list, default=[10, 50], help="Bulk batch sizes to sweep")
+    parser.add_argument("--bulk-concurrency", type=parse_list, default=[1, 4],
+                        help="Concurrent bulk clients to sweep")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per point")
+    parser.add_argument("--rps", type=float, default=0.0,
+                        help="Upstream rate limit for the service under test (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response delay in seconds")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="Fraction of stub responses that are 429")
+    parser.add_argument("--timeout-prob", type=float, default=0.0, help="Fraction of stub requests that hang")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for injected failures")
+    parser.add_argument("--report", default="load_report.json", help="Where to write the JSON report")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression vs the baseline")
+    args = parser.parse_args()
+
+    server = args.server
+    if server == "auto":
+        server = "gunicorn" if importlib.util.find_spec("gunicorn") else "dev"
+    worker_counts = args.workers if server == "gunicorn" else [1]
+    if server == "dev":
+        print("⚠️  gunicorn is not installed; measuring the threaded dev server (one process)")
+    if not os.path.isdir("/proc"):
+        print("⚠️  /proc is not available; RSS will not be reported")
+
+    stub, stub_url = start_stub_server(latency=args.latency, rate_limit_prob=args.rate_limit_prob,
+                                       timeout_prob=args.timeout_prob, seed=args.seed)
+    profile_pages = sorted(name for name in load_fixtures() if name != NOT_FOUND_PAGE)
+    scratch = tempfile.mkdtemp(prefix="codechef-load-")
+
+    print("=" * 110)
+    print(f"Server: {server}  workers {worker_counts}  threads {args.threads}   stub latency {args.latency}s   "
+          f"{args.duration:.0f}s per point")
+    print("=" * 110)
+
+    points, idle_points = [], []
+    for workers in worker_counts:
+        service = ServiceProcess(server, workers, args.threads, stub_url, args.rps, scratch).start()
+        try:
+            idle = RssSampler(service.process.pid)
+            idle.sample()
+            idle_rss = idle.summary()
+            print(f"\n{server} x{workers}" + (f"  idle rss {idle_rss['total_kb'] / 1024:.1f} MiB" if idle_rss else ""))
+            idle_points.append({"workers": workers, "rss": idle_rss})
+            for concurrency in args.concurrency:
+                call = single_call(service.url, handles(profile_pages, f"w{workers}c{concurrency}x"))
+                points.append(run_point(service, "single", call, concurrency, args.duration))
+                report_point(points[-1])
+            for batch_size in args.batch_sizes:
+                for concurrency in args.bulk_concurrency:
+                    next_handle = handles(profile_pages, f"w{workers}b{batch_size}c{concurrency}x")
+                    call = bulk_call(service.url, next_handle, batch_size)
+                    points.append(run_point(service, "bulk", call, concurrency, args.duration,
+                                            {"batch_size": batch_size}))
+                    report_point(points[-1])
+        finally:
+            service.stop()
+
+    report = {
+        "config": dict(vars(args), server=server, workers=worker_counts),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "upstream": {
+            "requests": stub.request_count,
+            "rate_limits_injected": stub.rate_limits_injected,
+            "timeouts_injected": stub.timeouts_injected,
+        },
+        "idle": idle_points,
+        "points": points,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Report written to {args.report} (server logs in {scratch})")
+    stub.shutdown()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(points, json.load(f), args.tolerance)
+        for point, metric, before, after in regressions:
+            print(f"  ❌ {point['scenario']} w{point['workers']} c{point['concurrency']}"
+                  f"{' b%s' % point['batch_size'] if 'batch_size' in point else ''}: {metric} {before} -> {after}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
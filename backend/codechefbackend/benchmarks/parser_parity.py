@@ -0,0 +1,125 @@
+"""
+Parser backend parity check
+Parses every saved fixture page with each HTML parser backend, in legacy
+(rescan per extractor), single-pass and regex fast path modes, and verifies
+the extractor outputs are identical, then reports parse throughput.
+
+Usage:
+    python benchmarks/parser_parity.py
+    python benchmarks/parser_parity.py --iterations 50
+
+Exits with status 1 if any variant disagrees with legacy html.parser.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sb import CodeChefScraper, HAS_LXML, _DocumentIndex  # noqa: E402
+from stub_server import load_fixtures  # noqa: E402
+
+# (parser, single_pass, fast_path)
+REFERENCE = ("html.parser", False, False)  # The original behaviour
+MODES = {
+    (False, False): "legacy",
+    (True, False): "single-pass",
+    (True, True): "fast-path",
+}
+
+
+def available_variants():
+    """(parser, single_pass, fast_path) combinations to compare against the reference."""
+    parsers = ["html.parser"]
+    if HAS_LXML:
+        parsers.append("lxml")
+    return [(parser,) + mode for parser in parsers for mode in MODES]
+
+
+def label(variant):
+    parser, single_pass, fast_path = variant
+    return f"{parser}/{MODES[(single_pass, fast_path)]}"
+
+
+def extract_all(scraper, html, username):
+    """Run every extractor separately so a mismatch points at the right one."""
+    soup = scraper._make_soup(html)
+    index = _DocumentIndex(soup) if scraper.single_pass else None
+    rating, global_rank, country_rank = scraper._extract_main_stats(soup, html, index)
+    return {
+        "_extract_main_stats": (rating, global_rank, country_rank),
+        "_get_full_name": scraper._get_full_name(soup, username, index),
+        "_get_stars": scraper._get_stars(soup, index),
+        "_get_problems_solved": scraper._get_problems_solved(html, soup, index),
+        "_extract_contest_details": scraper._extract_contest_details(soup, index),
+        "parse_profile": scraper.parse_profile(html, username),
+    }
+
+
+def make_scraper(variant):
+    parser, single_pass, fast_path = variant
+    return CodeChefScraper(parser=parser, single_pass=single_pass, fast_path=fast_path)
+
+
+def check_parity(pages, variants):
+    failures = 0
+    for name, body in sorted(pages.items()):
+        html = body.decode("utf-8")
+        before = failures
+        reference = extract_all(make_scraper(REFERENCE), html, name)
+        for variant in variants:
+            if variant == REFERENCE:
+                continue
+            outputs = extract_all(make_scraper(variant), html, name)
+            for extractor, expected in reference.items():
+                if outputs[extractor] != expected:
+                    failures += 1
+                    print(f"  ❌ {name}: {label(variant)} {extractor} differs")
+                    print(f"     {label(REFERENCE)}: {str(expected)[:200]}")
+                    print(f"     {label(variant)}: {str(outputs[extractor])[:200]}")
+        if failures == before:
+            print(f"  ✅ {name}: identical across {len(variants)} variants")
+    return failures
+
+
+def time_parsers(pages, variants, iterations):
+    print(f"\n{'Variant':<26} {'ms/profile':>12} {'profiles/s':>12}")
+    print("-" * 52)
+    for variant in variants:
+        scraper = make_scraper(variant)
+        docs = [(name, body.decode("utf-8")) for name, body in pages.items()]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for name, html in docs:
+                scraper.parse_profile(html, name)
+        elapsed = time.perf_counter() - start
+        per_profile = elapsed / (iterations * len(docs))
+        print(f"{label(variant):<26} {per_profile * 1000:>12.2f} {1 / per_profile:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify parser backends produce identical profiles")
+    parser.add_argument("--iterations", type=int, default=20, help="Timing passes over the corpus")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    variants = available_variants()
+    if not HAS_LXML:
+        print("⚠️  lxml is not installed; only html.parser is available")
+
+    print("=" * 60)
+    print(f"Parity over {len(pages)} fixture(s)")
+    print("=" * 60)
+    failures = check_parity(pages, variants)
+    time_parsers(pages, variants, args.iterations)
+
+    if failures:
+        print(f"\n❌ {failures} mismatch(es)")
+        sys.exit(1)
+    print("\n✅ All variants agree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Local CodeChef stub server
+Replays saved profile pages from benchmarks/fixtures so benchmarks never touch codechef.com.
+Can also misbehave like the real upstream: slow responses, 429s and hung requests.
+
+Usage:
+    python benchmarks/stub_server.py --port 8099 --latency 0.05
+    python benchmarks/stub_server.py --rate-limit-prob 0.1 --timeout-prob 0.02 --hang 35
+    CODECHEF_BASE_URL=http://127.0.0.1:8099 python sb.py
+
+Fixtures: every benchmarks/fixtures/<name>.html is served at /users/<name> (and at
+/users/<name>--<anything>, for distinct handles with the same page); 404.html is the body
+of the 404 returned for usernames starting with "missing".
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+NOT_FOUND_PAGE = "404"
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """Load every fixture page keyed by file name (without .html), including the 404 page."""
+    pages = {}
+    for name in os.listdir(fixtures_dir):
+        if name.endswith(".html"):
+            with open(os.path.join(fixtures_dir, name), "rb") as f:
+                pages[name[:-5]] = f.read()
+    return pages
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real upstream
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            roll = server.random.random()
+        if server.latency:
+            time.sleep(server.latency)
+
+        # Injected upstream misbehaviour
+        if roll < server.timeout_prob:
+            with server.lock:
+                server.timeouts_injected += 1
+            time.sleep(server.hang)  # Longer than the client's timeout
+            return self._send(504, b"Gateway timeout")
+        if roll < server.timeout_prob + server.rate_limit_prob:
+            with server.lock:
+                server.rate_limits_injected += 1
+            return self._send(429, b"Too many requests", retry_after=server.retry_after)
+
+        path = self.path.split("?", 1)[0]
+        if not path.startswith("/users/"):
+            return self._send(404, server.not_found_page)
+
+        username = path[len("/users/"):].strip("/")
+        if username.startswith("missing"):
+            return self._send(404, server.not_found_page)
+        # Any other username maps onto a fixture: exact name first, then the default page
+        body = server.pages.get(username.split("--", 1)[0])
+        if body is None:
+            body = server.pages.get(server.default_page)
+        if body is None:
+            return self._send(404, server.not_found_page)
+        if server.etags:
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, b"", etag)
+            return self._send(200, body, etag)
+        self._send(200, body)
+
+    def do_HEAD(self):
+        self.server.request_count += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, status, body, etag=None, retry_after=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+def start_stub_server(port=0, latency=0.0, default_page="rated", etags=False, rate_limit_prob=0.0,
+                      retry_after=None, timeout_prob=0.0, hang=35.0, seed=None):
+    """Start the stub in a daemon thread. Returns (server, base_url).
+
+    With ``etags`` pages carry an ETag and If-None-Match is answered with 304.
+    ``rate_limit_prob`` of requests get a 429 (with ``retry_after`` if set) and
+    ``timeout_prob`` of them stall for ``hang`` seconds before a 504.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.pages = load_fixtures()
+    server.not_found_page = server.pages.pop(NOT_FOUND_PAGE, b"User not found")
+    server.default_page = default_page
+    server.latency = latency
+    server.etags = etags
+    server.rate_limit_prob = rate_limit_prob
+    server.retry_after = retry_after
+    server.timeout_prob = timeout_prob
+    server.hang = hang
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.rate_limits_injected = 0
+    server.timeouts_injected = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local CodeChef stub server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay every response")
+    parser.add_argument("--default-page", default="rated", help="Fixture served for unknown usernames")
+    parser.add_argument("--etags", action="store_true", help="Send ETags and answer conditional requests")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--timeout-prob", type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument("--hang", type=float, default=35.0, help="Seconds a hung request stalls")
+    parser.add_argument("--seed", type=int, help="Seed for the injected failures")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.port, args.latency, args.default_page, args.etags,
+                                         args.rate_limit_prob, args.retry_after, args.timeout_prob, args.hang,
+                                         args.seed)
+    print(f"🧪 Stub CodeChef serving {len(server.pages)} fixture(s) at {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
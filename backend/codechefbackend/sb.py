@@ -1,46 +1,400 @@
-from flask import Flask, request, jsonify
-from bs4 import BeautifulSoup
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from bs4 import BeautifulSoup, NavigableString, Tag
 import requests
 import re
 import json
+import html as html_lib
+import atexit
+import bisect
+import codecs
+import cProfile
+import hashlib
+import hmac
 import time
 import random
+import os
+import sys
+import threading
+import asyncio
+import queue
+import sqlite3
+import socket
+import uuid
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask_cors import CORS
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from urllib3.exceptions import EmptyPoolError
+
+try:
+    import lxml  # noqa: F401  (C-accelerated tree builder for BeautifulSoup)
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
 
 app = Flask(__name__)
 CORS(app)
 
+# Upstream / connection pool settings (override via environment)
+CODECHEF_BASE_URL = os.environ.get("CODECHEF_BASE_URL", "https://www.codechef.com")
+POOL_MAXSIZE = int(os.environ.get("CODECHEF_POOL_MAXSIZE", "10"))  # Max pooled connections per worker
+POOL_BLOCK = os.environ.get("CODECHEF_POOL_BLOCK", "1") == "1"  # Wait for a free connection instead of opening extras
+POOL_TIMEOUT = float(os.environ.get("CODECHEF_POOL_TIMEOUT", "10"))  # Longest wait for a free connection when blocking
+POOL_IDLE_TIMEOUT = float(os.environ.get("CODECHEF_POOL_IDLE_TIMEOUT", "60"))  # Close sockets idle longer than this
+
+# HTML parser backend: "lxml" (fast, needs lxml installed) or "html.parser" (pure Python)
+HTML_PARSER = os.environ.get("CODECHEF_HTML_PARSER", "lxml" if HAS_LXML else "html.parser")
+if HTML_PARSER == "lxml" and not HAS_LXML:
+    print("CODECHEF_HTML_PARSER=lxml but lxml is not installed; falling back to html.parser")
+    HTML_PARSER = "html.parser"
+
+# Regex-first fast path: read fields straight from the raw HTML, build a tree only for what is missing
+FAST_PATH = os.environ.get("CODECHEF_FAST_PATH", "1") == "1"
+
+# Streaming page reads
+STREAM_FETCH = os.environ.get("CODECHEF_STREAM_FETCH", "1") == "1"  # Read incrementally and stop once every field is found
+STREAM_CHUNK_SIZE = int(os.environ.get("CODECHEF_STREAM_CHUNK_SIZE", "16384"))
+MAX_PAGE_BYTES = int(os.environ.get("CODECHEF_MAX_PAGE_BYTES", str(2 * 1024 * 1024)))  # Never read more than this
+STREAM_DRAIN_BYTES = int(os.environ.get("CODECHEF_STREAM_DRAIN_BYTES", "65536"))  # Finish small remainders to keep the connection
+
+# Bulk fetch engine settings
+BULK_ENGINE = os.environ.get("CODECHEF_BULK_ENGINE", "async")  # "async" (concurrent) or "sync" (one by one)
+BULK_CONCURRENCY = int(os.environ.get("CODECHEF_BULK_CONCURRENCY", "4"))  # Max in-flight fetches per bulk request
+
+# Host-wide upstream rate limit (token bucket shared by every worker through SQLite)
+RATE_LIMIT_RPS = float(os.environ.get("CODECHEF_RATE_LIMIT_RPS", "0.5"))  # 0 disables
+RATE_LIMIT_BURST = float(os.environ.get("CODECHEF_RATE_LIMIT_BURST", "3"))  # Requests allowed back to back after idling
+RATE_LIMIT_DB_PATH = os.environ.get("CODECHEF_RATE_LIMIT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.sqlite3"))  # "" = per process
+
+# Adaptive (AIMD) pacing of the shared rate: add on healthy responses, multiply down on pushback
+ADAPTIVE_PACING = os.environ.get("CODECHEF_ADAPTIVE_PACING", "1") == "1"
+PACING_MIN_RPS = float(os.environ.get("CODECHEF_PACING_MIN_RPS", "0.1"))
+PACING_MAX_RPS = float(os.environ.get("CODECHEF_PACING_MAX_RPS", "2.0"))
+PACING_INCREASE = float(os.environ.get("CODECHEF_PACING_INCREASE", "0.01"))  # req/s added per healthy response
+PACING_DECREASE = float(os.environ.get("CODECHEF_PACING_DECREASE", "0.5"))  # Rate multiplier on 429/403/5xx/timeout
+PACING_COOLDOWN = float(os.environ.get("CODECHEF_PACING_COOLDOWN", "10"))  # Min seconds between decreases
+
+# Priority classes for upstream tokens: interactive lookups jump ahead of bulk work
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"  # Bulk runs, jobs and background revalidation
+BULK_MIN_SHARE = float(os.environ.get("CODECHEF_BULK_MIN_SHARE", "0.2"))  # Fraction of the rate bulk always gets
+
+# Circuit breaker around upstream fetches (per worker process)
+CIRCUIT_FAILURES = int(os.environ.get("CODECHEF_CIRCUIT_FAILURES", "5"))  # Consecutive failures that open it
+CIRCUIT_ERROR_RATE = float(os.environ.get("CODECHEF_CIRCUIT_ERROR_RATE", "0.5"))  # Or this failure ratio...
+CIRCUIT_WINDOW = int(os.environ.get("CODECHEF_CIRCUIT_WINDOW", "20"))  # ...over the last N calls
+CIRCUIT_MIN_CALLS = int(os.environ.get("CODECHEF_CIRCUIT_MIN_CALLS", "10"))  # ...once at least this many were made
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CODECHEF_CIRCUIT_OPEN_SECONDS", "30"))  # Fail fast this long before probing
+
+# Retry policy (the only retry layer: the HTTP session never retries on its own)
+REQUEST_TIMEOUT = float(os.environ.get("CODECHEF_REQUEST_TIMEOUT", "30"))  # Per attempt, capped by the deadline
+RETRY_MAX_ATTEMPTS = int(os.environ.get("CODECHEF_RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.environ.get("CODECHEF_RETRY_BASE_DELAY", "1"))  # Decorrelated jitter bounds
+RETRY_MAX_DELAY = float(os.environ.get("CODECHEF_RETRY_MAX_DELAY", "20"))
+RETRY_DEADLINE = float(os.environ.get("CODECHEF_RETRY_DEADLINE", "60"))  # Total seconds one username may take
+BULK_DEADLINE = float(os.environ.get("CODECHEF_BULK_DEADLINE", "900"))  # Whole wait/stream bulk request
+JOB_DEADLINE = float(os.environ.get("CODECHEF_JOB_DEADLINE", "7200"))  # Whole background job, from submission
+
+# Profile cache settings (per worker process)
+CACHE_TTL = float(os.environ.get("CODECHEF_CACHE_TTL", "600"))  # Seconds a scraped profile stays fresh
+CACHE_MAX_ENTRIES = int(os.environ.get("CODECHEF_CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.environ.get("CODECHEF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # Approximate JSON size budget
+
+# Persistent profile store (shared by all workers, survives restarts)
+STORE_DB_PATH = os.environ.get("CODECHEF_STORE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.sqlite3"))  # "" disables
+STORE_MAX_AGE = min(float(os.environ.get("CODECHEF_STORE_MAX_AGE", str(CACHE_TTL))), CACHE_TTL)  # Stored profiles younger than this are served; never fresher than the memory TTL
+STORE_RETENTION = float(os.environ.get("CODECHEF_STORE_RETENTION", str(30 * 24 * 3600)))  # Rows older than this are pruned
+
+# Stale-while-revalidate serving
+SWR_GRACE = float(os.environ.get("CODECHEF_SWR_GRACE", "3600"))  # Stale profiles this far past freshness may still be served
+SWR_DEFAULT = os.environ.get("CODECHEF_ALLOW_STALE", "0") == "1"  # Default for /api/codechef?allow_stale=
+SWR_REFRESH_CONCURRENCY = int(os.environ.get("CODECHEF_SWR_CONCURRENCY", "2"))  # Background refreshes running at once
+SWR_MAX_PENDING = int(os.environ.get("CODECHEF_SWR_MAX_PENDING", "100"))  # Refreshes queued beyond this are dropped
+
+# Negative cache (unknown handles and usernames that keep failing)
+NEGATIVE_TTL = float(os.environ.get("CODECHEF_NEGATIVE_TTL", "300"))  # Shorter than CACHE_TTL on purpose
+NEGATIVE_FAILURES = int(os.environ.get("CODECHEF_NEGATIVE_FAILURES", "3"))  # Consecutive failures before caching one
+NEGATIVE_MAX_ENTRIES = int(os.environ.get("CODECHEF_NEGATIVE_MAX_ENTRIES", "10000"))
+
+# Background bulk job settings
+JOBS_DB_PATH = os.environ.get("CODECHEF_JOBS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bulk_jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("CODECHEF_JOB_WORKERS", "2"))  # Jobs processed concurrently per worker process
+JOB_LEASE_SECONDS = float(os.environ.get("CODECHEF_JOB_LEASE", "300"))  # Jobs without a heartbeat this long get resumed elsewhere
+JOB_RETENTION_SECONDS = float(os.environ.get("CODECHEF_JOB_RETENTION", str(7 * 24 * 3600)))  # Finished jobs are kept this long
+
+# Prometheus metrics (each worker flushes its series to SQLite; /metrics merges every worker's)
+METRICS_ENABLED = os.environ.get("CODECHEF_METRICS", "1") == "1"
+METRICS_DB_PATH = os.environ.get("CODECHEF_METRICS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.sqlite3"))  # "" = this process only
+METRICS_FLUSH_INTERVAL = float(os.environ.get("CODECHEF_METRICS_FLUSH_INTERVAL", "5"))  # Seconds between snapshots
+METRICS_RETENTION = float(os.environ.get("CODECHEF_METRICS_RETENTION", str(24 * 3600)))  # Exited workers' series kept this long
+
+# Per-request timing breakdown and opt-in sampling profiler
+SERVER_TIMING = os.environ.get("CODECHEF_SERVER_TIMING", "1") == "1"  # Server-Timing header on every response
+PROFILE_CONFIG_PATH = os.environ.get("CODECHEF_PROFILE_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiling.json"))  # Shared by every worker
+PROFILE_DIR = os.environ.get("CODECHEF_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("CODECHEF_PROFILE_MAX_FILES", "200"))  # Oldest profiles are deleted beyond this
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("CODECHEF_PROFILE_INTERVAL", "0.005"))  # Stack sampling period (collapsed format)
+PROFILED_ROUTES = ('/api/codechef', '/api/codechef/bulk')
+ADMIN_TOKEN = os.environ.get("CODECHEF_ADMIN_TOKEN", "")  # Required in X-Admin-Token by admin endpoints; unset = they are disabled
+
+# Scraper error messages that callers branch on
+ERROR_NOT_FOUND = "User not found"
+ERROR_RATE_LIMITED = "Rate limited - try again later"
+ERROR_FORBIDDEN = "Access forbidden - possible IP block"
+ERROR_CONNECTION = "Connection error"
+ERROR_CIRCUIT_OPEN = "Upstream unavailable - circuit open"
+ERROR_DEADLINE = "Deadline exceeded"
+ERROR_TIMEOUT = "Request timeout"
+ERROR_BUSY = "Busy - no upstream connection free, try again later"
+
+# Failures caused by the upstream or our IP, not by the username itself
+UPSTREAM_WIDE_ERRORS = {ERROR_RATE_LIMITED, ERROR_FORBIDDEN, ERROR_CONNECTION, ERROR_CIRCUIT_OPEN,
+                        ERROR_DEADLINE, ERROR_TIMEOUT, ERROR_BUSY}
+
+
+def is_upstream_wide(error):
+    """True for failures that say nothing about the username (incl. any 5xx)."""
+    return error in UPSTREAM_WIDE_ERRORS or str(error).startswith("HTTP Error 5")
+
+# Parsed profile fields, in response order
+PROFILE_FIELDS = ("full_name", "rating", "global_rank", "country_rank", "stars",
+                  "problems_solved", "contest_history")
+
+
+def parse_fields(value):
+    """Profile fields requested as ``"rating,stars"`` (or a list), in PROFILE_FIELDS order.
+
+    Returns None (every field) for an empty value; raises ValueError naming
+    any unknown field.
+    """
+    if value is None or value == "" or value == []:
+        return None
+    names = value.split(",") if isinstance(value, str) else value
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("fields must be a comma-separated string or an array of field names")
+    requested = {name.strip() for name in names if name.strip()}
+    unknown = requested - set(PROFILE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. "
+                         f"Valid fields: {', '.join(PROFILE_FIELDS)}")
+    selected = tuple(field for field in PROFILE_FIELDS if field in requested)
+    return selected if selected and len(selected) < len(PROFILE_FIELDS) else None
+
+
+def select_fields(data, fields):
+    """``data`` without the profile fields that were not requested (status keys are kept)."""
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key not in PROFILE_FIELDS or key in fields}
+
+
+
+class PatternRegistry:
+    """Every extractor regex, compiled once at import, with hit counters.
+
+    Extractors look patterns up by name instead of compiling them inside
+    their loops. ``search``/``findall``/``finditer`` count calls and hits per
+    name, so /api/codechef/stats shows which fallbacks actually fire.
+    Counters are plain dict increments: cheap, and approximate under heavy
+    thread contention, which is fine for diagnostics.
+    """
+
+    def __init__(self):
+        self._patterns = {}
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.hits = {}
+
+    def register(self, name, pattern, flags=0):
+        compiled = re.compile(pattern, flags)
+        self._patterns[name] = compiled
+        self.calls[name] = 0
+        self.hits[name] = 0
+        return compiled
+
+    def get(self, name):
+        return self._patterns[name]
+
+    def label(self, label_text):
+        """Name of the case-insensitive pattern for a label, compiling it on first use.
+
+        Also registers ``rank_text:<label>`` (the "Label: 1234" text fallback).
+        """
+        name = f"label:{label_text}"
+        if name not in self._patterns:
+            with self._lock:
+                if name not in self._patterns:
+                    self.register(f"rank_text:{label_text}",
+                                  rf'{label_text}[:\s#-]{{0,6}}([0-9,]{{1,7}})', re.I)
+                    self.register(name, label_text, re.I)
+        return name
+
+    def record(self, name, hit):
+        """Count a use of a pattern that bs4 applied for us (e.g. ``find(string=...)``)."""
+        self.calls[name] += 1
+        if hit:
+            self.hits[name] += 1
+
+    def search(self, name, text):
+        m = self._patterns[name].search(text)
+        self.record(name, m is not None)
+        return m
+
+    def findall(self, name, text):
+        found = self._patterns[name].findall(text)
+        self.record(name, bool(found))
+        return found
+
+    def finditer(self, name, text):
+        self.calls[name] += 1
+        for m in self._patterns[name].finditer(text):
+            self.hits[name] += 1
+            yield m
+
+    def stats(self):
+        return {
+            name: {"calls": self.calls[name], "hits": self.hits[name]}
+            for name in sorted(self._patterns)
+        }
+
+
+PATTERNS = PatternRegistry()
+
+# Shared helpers
+PATTERNS.register("number", r"(-?\d+)")
+PATTERNS.register("parenthetical", r'\([^)]*\)')
+
+# Raw-HTML fast path. Each one only matches the canonical profile markup;
+# anything unusual is left to the DOM extractors.
+PATTERNS.register("fast_full_name",
+                  r'<header\b[^>]*class="[^"]*\buser-details-container\b[^"]*"[^>]*>.*?<h1\b[^>]*>([^<]*)</h1>',
+                  re.S)
+PATTERNS.register("fast_rating", r'<div\b[^>]*class="rating-number"[^>]*>\s*(\d{3,5})\s*<')
+PATTERNS.register("fast_global_rank", r'<strong>\s*(\d{1,7})\s*</strong>\s*</a>\s*Global Rank')
+PATTERNS.register("fast_country_rank", r'<strong>\s*(\d{1,7})\s*</strong>\s*</a>\s*Country Rank')
+PATTERNS.register("fast_star_block", r'<div\b[^>]*class="rating-star"[^>]*>(.*?)</div>', re.S)
+PATTERNS.register("fast_star", r'<span\b[^>]*class="(?:[^"]*\s)?star(?:\s[^"]*)?"')
+
+# Rating near the "CodeChef Rating" label, then its fallbacks
+PATTERNS.register("label_rating", r'CodeChef\s*Rating', re.I)
+PATTERNS.register("label_any", r'CodeChef\s*Rating|Global Rank|Country Rank', re.I)
+PATTERNS.register("rating_sibling_text", r'(^|\D)(\d{3,5})(\D|$)')
+PATTERNS.register("rating_sibling_anchor", r'\d{3,5}')
+PATTERNS.register("rating_previous_text", r'(^|\D)(\d{3,5})(\D|$)')
+PATTERNS.register("rating_json", r'"rating"\s*:\s*("?)(-?\d+)\1')
+
+# Ranks
+PATTERNS.register("rank_sibling_anchor", r'[#]?\s*\d{1,7}')
+PATTERNS.register("rank_sibling_text", r'(\d{1,7})')
+PATTERNS.register("rank_parent_anchor", r'[#]?\s*\d{1,7}')
+PATTERNS.register("country_link_digits", r'(\d+)')
+
+# Stars
+PATTERNS.register("stars_text", r'(\d+)\s*★')
+
+# Problems solved, tried in order
+SOLVED_PATTERNS = ["solved_problemsSolved", "solved_fully_solved_json", "solved_problems_solved_json",
+                   "solved_fully_solved_text", "solved_problems_solved_text"]
+PATTERNS.register("solved_problemsSolved", r'"problemsSolved":\s*(\d+)', re.I)
+PATTERNS.register("solved_fully_solved_json", r'"fully_solved":\s*(\d+)', re.I)
+PATTERNS.register("solved_problems_solved_json", r'"problems_solved":\s*(\d+)', re.I)
+PATTERNS.register("solved_fully_solved_text", r'Fully Solved.*?(\d+)', re.I)
+PATTERNS.register("solved_problems_solved_text", r'Problems Solved.*?(\d+)', re.I)
+PATTERNS.register("solved_section_digits", r'\d+')
+
+# Embedded contest history variables, tried in order
+CONTEST_PATTERNS = ["contest_all_rating", "contest_rating_data", "contest_ratingData"]
+PATTERNS.register("contest_all_rating", r'var\s+all_rating\s*=\s*(\[.*?\]);', re.DOTALL)
+PATTERNS.register("contest_rating_data", r'rating_data\s*=\s*(\[.*?\]);', re.DOTALL)
+PATTERNS.register("contest_ratingData", r'ratingData\s*:\s*(\[.*?\])', re.DOTALL)
+
+
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose blocking pools wait at most ``pool_timeout`` for a connection.
+
+    requests never passes urllib3's ``pool_timeout``, so with ``pool_block``
+    a caller would otherwise wait forever when every connection is checked
+    out. The wait ends in ``PoolExhausted``.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ["pool_timeout"]
+
+    def __init__(self, pool_timeout=POOL_TIMEOUT, **kwargs):
+        self.pool_timeout = pool_timeout  # Read by init_poolmanager, which HTTPAdapter.__init__ calls
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pool_timeout = self.pool_timeout
+
+        def bounded(pool_cls):
+            class BoundedPool(pool_cls):
+                def _get_conn(self, timeout=None):
+                    return super()._get_conn(pool_timeout if timeout is None else timeout)
+            BoundedPool.__name__ = BoundedPool.__qualname__ = pool_cls.__name__  # Keep error messages familiar
+            return BoundedPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: bounded(pool_cls) for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()}
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:  # requests lets this one through unwrapped
+            raise PoolExhausted(str(e)) from e
+
+
+class PoolExhausted(Exception):
+    """No pooled connection came free in time: a local limit, not an upstream failure."""
+
+
 class CodeChefScraper:
     """Robust CodeChef profile scraper with rate limiting and retry logic."""
 
-    def __init__(self, skip_rate_limit=False):
-        self.base_url = "https://www.codechef.com"
-        self.session = self._create_robust_session()
-        self.last_request_time = 0
-        self.min_delay = 2.0  # Minimum 2 seconds between requests
-        self.max_delay = 4.0  # Maximum 4 seconds between requests
-        self.skip_rate_limit = skip_rate_limit  # Flag to skip rate limiting (for single API calls)
+    def __init__(self, skip_rate_limit=False, registry=None, base_url=None, parser=None, single_pass=True,
+                 fast_path=FAST_PATH, stream=STREAM_FETCH, max_page_bytes=MAX_PAGE_BYTES, pacer=None, breaker=None,
+                 retry_policy=None):
+        self.base_url = base_url or CODECHEF_BASE_URL
+        self.parser = parser or HTML_PARSER  # BeautifulSoup tree builder
+        self.single_pass = single_pass  # Index the tree once instead of rescanning it per extractor
+        self.fast_path = fast_path  # Try raw-HTML regexes before building a tree
+        self.stream = stream  # Incremental, size-capped body reads
+        self.max_page_bytes = max_page_bytes
+        self.profiles_parsed = 0
+        self.dom_builds = 0
+        self.bytes_read = 0
+        self.early_stops = 0
+        self.truncated_pages = 0
+        self.connections_dropped = 0
+        self.not_modified = 0
+        self.unchanged_pages = 0
+        self._registry = registry  # Shared pooled session (see SessionRegistry)
+        self._own_session = None if registry else self._create_robust_session()
+        self.pacer = pacer  # AdaptivePacer; defaults to the host-wide one
+        self.breaker = breaker  # CircuitBreaker; defaults to this worker's one
+        self.retry_policy = retry_policy  # RetryPolicy; defaults to the module one
+        self.skip_rate_limit = skip_rate_limit  # Caller already took a token (async bulk engine)
+
+    @property
+    def session(self):
+        if self._registry is not None:
+            return self._registry.get_session()
+        return self._own_session
         
-    def _create_robust_session(self):
-        """Create a session with retry logic and connection pooling."""
+    @staticmethod
+    def _create_robust_session(pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK, pool_timeout=POOL_TIMEOUT):
+        """Create a session with connection pooling (retries live in RetryPolicy)."""
         session = requests.Session()
         
-        # Retry strategy for temporary failures
-        retry_strategy = Retry(
-            total=3,  # Total retries
-            backoff_factor=1,  # Wait 1, 2, 4 seconds between retries
-            status_forcelist=[429, 500, 502, 503, 504],  # Retry on these status codes
-            allowed_methods=["GET"]
-        )
-        
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
+        adapter = BoundedPoolAdapter(
+            max_retries=0,  # Never retry here: scrape_user_data owns every retry and its deadline
             pool_connections=10,
-            pool_maxsize=10,
-            pool_block=False
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            pool_timeout=pool_timeout
         )
         
         session.mount("http://", adapter)
@@ -66,115 +420,442 @@ class CodeChefScraper:
         
         return session
 
-    def _rate_limit(self):
-        """Implement rate limiting with random jitter to avoid detection."""
-        # Skip rate limiting if flag is set (frontend handles it)
-        if self.skip_rate_limit:
-            return
-            
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        # Add random delay between min_delay and max_delay
-        delay = random.uniform(self.min_delay, self.max_delay)
-        
-        if time_since_last < delay:
-            sleep_time = delay - time_since_last
-            time.sleep(sleep_time)
-        
-        self.last_request_time = time.time()
+    @property
+    def _pacer(self):
+        return self.pacer or pacer
+
+    @property
+    def _breaker(self):
+        return self.breaker or circuit
+
+    def _rate_limit(self, retry=False, deadline=None, priority=PRIORITY_INTERACTIVE, reserved=False):
+        """Wait for a token from the host-wide bucket shared by every worker.
+
+        Returns False (without waiting) if the token would come after ``deadline``.
+        """
+        # Skip rate limiting if the caller already reserved a token (retries always queue)
+        if (self.skip_rate_limit or reserved) and not retry:
+            return True
+        max_wait = deadline - time.time() if deadline else None
+        with request_timer.span("rate_limit"):
+            return self._pacer.acquire(max_wait, priority) is not None
+
+    def get_user_data(self, username, validators=None, deadline=None, priority=PRIORITY_INTERACTIVE, fields=None,
+                      reserved=False):
+        """Main entry point with retry logic.
+
+        ``validators`` is an optional dict holding the last stored copy of the
+        profile (``data``) with its ``etag``, ``last_modified`` and
+        ``content_hash``. It makes the fetch conditional, and is updated in
+        place with the validators of the new response. ``deadline`` is an
+        optional ``time.time()`` limit (a bulk job's); the retry policy's own
+        per-username deadline applies either way. ``priority`` is the token
+        class the fetch queues in. ``fields`` limits the extractors that run,
+        and the keys returned, to those profile fields. ``reserved`` means the
+        caller already holds the token for the first attempt.
+        """
+        return self.scrape_user_data(username, validators=validators, deadline=deadline, priority=priority,
+                                     fields=fields, reserved=reserved)
+
+    def scrape_user_data(self, username, validators=None, deadline=None, priority=PRIORITY_INTERACTIVE,
+                         fields=None, reserved=False):
+        """Fetch CodeChef data, retrying transient failures under the retry policy.
 
-    def get_user_data(self, username):
-        """Main entry point with retry logic."""
-        return self.scrape_user_data(username)
+        Token waits, requests and backoff sleeps all fit inside one deadline,
+        so a username never costs more than ``retry_policy.deadline`` seconds.
+        """
+        policy = self.retry_policy or retry_policy
+        deadline = min(deadline or float('inf'), time.time() + policy.deadline)
+        attempts = []
+        delay = policy.base_delay  # Seeds the jitter: the first retry sleeps between base_delay and 3x that
+        deadline_hit = False
+        for attempt in range(1, policy.max_attempts + 1):
+            started = time.time()
+            data, reason, retry_after = self._attempt(username, validators, attempt > 1, deadline, priority,
+                                                      fields, reserved)
+            outcome = "ok" if data.get('success', False) else reason or data.get('error')
+            attempts.append({"attempt": attempt, "outcome": outcome,
+                             "ms": round((time.time() - started) * 1000, 1)})
+            if data.get('error') == ERROR_DEADLINE:
+                deadline_hit = True
+            if reason is None or attempt == policy.max_attempts:
+                break
+            delay = policy.next_delay(delay)
+            if retry_after:
+                delay = max(delay, retry_after)
+            if time.time() + delay >= deadline:
+                deadline_hit = True
+                break
+            attempts[-1]["backoff_ms"] = round(delay * 1000, 1)
+            print(f"{reason} for {username}. Retry {attempt}/{policy.max_attempts - 1} in {delay:.1f}s")
+            with request_timer.span("retry_backoff"):
+                time.sleep(delay)
 
-    def scrape_user_data(self, username, retry_count=0, max_retries=3):
-        """Fetch CodeChef data with exponential backoff on failures."""
+        policy.record(username, attempts, deadline_hit)
+        if not data.get('success', False):
+            data = dict(data, attempts=len(attempts))
+            if deadline_hit:
+                data["deadline_exceeded"] = True
+        return data
+
+    def _attempt(self, username, validators, retry, deadline, priority=PRIORITY_INTERACTIVE, fields=None,
+                 reserved=False):
+        """Make one upstream request.
+
+        Returns (data, retry_reason, retry_after); ``retry_reason`` is None
+        when the outcome is final (success, 404, 403, open circuit, ...).
+        """
+        # Fail fast while the upstream is known to be down (this also stops retry loops)
+        if not self._breaker.allow():
+            return {"error": ERROR_CIRCUIT_OPEN, "username": username,
+                    "retry_after": round(self._breaker.retry_after(), 1)}, None, None
+        # Apply rate limiting
+        if not self._rate_limit(retry, deadline, priority, reserved):
+            self._breaker.release()
+            return {"error": ERROR_DEADLINE, "username": username}, None, None
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self._breaker.release()
+            return {"error": ERROR_DEADLINE, "username": username}, None, None
+        fetch_started = None
         try:
-            # Apply rate limiting
-            self._rate_limit()
-            
             url = f"{self.base_url}/users/{username}"
+            previous = validators.get("data") if validators else None
+            known_hash = validators.get("content_hash") if previous is not None else None
+            headers = {}
+            if previous is not None:
+                if validators.get("etag"):
+                    headers['If-None-Match'] = validators["etag"]
+                if validators.get("last_modified"):
+                    headers['If-Modified-Since'] = validators["last_modified"]
             
-            # Make request with timeout
-            response = self.session.get(url, timeout=30)
+            # Make request with timeout (never past the deadline)
+            fetch_started = time.perf_counter()
+            with metrics.tracking("codechef_upstream_in_flight"):
+                response = self.session.get(url, timeout=min(REQUEST_TIMEOUT, remaining), stream=self.stream,
+                                            headers=headers)
+                if response.status_code != 200:
+                    response.content  # Small error page: drain it so the pooled connection is reused
+                elif self.stream:
+                    html, found, truncated = self._read_page(response, username, fields)
+                else:
+                    with request_timer.span("decode"):
+                        html, found, truncated = response.text, None, False
+                    self.bytes_read += len(response.content)
+            self._record_fetch(fetch_started, str(response.status_code))
+
+            # Feed the adaptive pacer: pushback slows the whole host down
+            retry_after = None
+            if response.status_code in (403, 429) or response.status_code >= 500:
+                header = response.headers.get('Retry-After', '')
+                retry_after = float(header) if header.isdigit() else None
+                self._pacer.on_throttle(retry_after)
+                self._breaker.record_failure()
+            else:
+                self._pacer.on_success()
+                self._breaker.record_success()
+
+            if response.status_code == 304 and previous is not None:
+                self.not_modified += 1
+                return self._reuse_profile(previous, username, fields), None, None
             
             # Handle different status codes
             if response.status_code == 404:
-                return {"error": "User not found", "username": username}
+                return {"error": ERROR_NOT_FOUND, "username": username}, None, None
             
             if response.status_code == 429:  # Rate limited
-                if retry_count < max_retries:
-                    wait_time = (2 ** retry_count) * random.uniform(3, 6)  # Exponential backoff
-                    print(f"Rate limited for {username}. Waiting {wait_time:.1f}s before retry {retry_count + 1}/{max_retries}")
-                    time.sleep(wait_time)
-                    return self.scrape_user_data(username, retry_count + 1, max_retries)
-                return {"error": "Rate limited - try again later", "username": username}
+                return {"error": ERROR_RATE_LIMITED, "username": username}, "rate_limited", retry_after
             
             if response.status_code == 403:  # Forbidden
-                return {"error": "Access forbidden - possible IP block", "username": username}
+                return {"error": ERROR_FORBIDDEN, "username": username}, None, None
             
             if response.status_code != 200:
-                if retry_count < max_retries:
-                    wait_time = (2 ** retry_count) * random.uniform(1, 3)
-                    print(f"HTTP {response.status_code} for {username}. Retrying in {wait_time:.1f}s...")
-                    time.sleep(wait_time)
-                    return self.scrape_user_data(username, retry_count + 1, max_retries)
-                return {"error": f"HTTP Error {response.status_code}", "username": username}
-
-            html = response.text
-            soup = BeautifulSoup(html, 'html.parser')
-
-            # Extract data
-            rating, global_rank, country_rank = self._extract_main_stats(soup, html)
-            full_name = self._get_full_name(soup, username)
-            stars = self._get_stars(soup)
-            problems_solved = self._get_problems_solved(html, soup)
-            contests = self._extract_contest_details(soup)
+                return ({"error": f"HTTP Error {response.status_code}", "username": username},
+                        f"http_{response.status_code}", retry_after)
 
-            return {
-                "username": username,
-                "full_name": full_name,
-                "rating": rating,
-                "global_rank": global_rank,
-                "country_rank": country_rank,
-                "stars": stars,
-                "problems_solved": problems_solved,
-                "contest_history": contests,
-                "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "success": True
-            }
+            digest = self._content_hash(html) if found is None else None
+            if validators is not None:
+                validators.update(etag=response.headers.get('ETag'),
+                                  last_modified=response.headers.get('Last-Modified'),
+                                  content_hash=digest)
+            if digest is not None and digest == known_hash:
+                self.unchanged_pages += 1
+                return self._reuse_profile(previous, username, fields), None, None
+
+            profile = self.parse_profile(html, username, found, fields)
+            if truncated:
+                profile["truncated"] = True  # Parsed from the first max_page_bytes only: never cached
+            profile["scraped_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            profile["success"] = True
+            return profile, None, None
+
+        except PoolExhausted:
+            # Our own pool is saturated: neither the breaker nor the retry policy counts it
+            self._record_fetch(None, "pool_busy")
+            self._breaker.release()
+            return {"error": ERROR_BUSY, "username": username}, None, None
             
         except requests.exceptions.Timeout:
-            if retry_count < max_retries:
-                wait_time = (2 ** retry_count) * random.uniform(1, 2)
-                print(f"Timeout for {username}. Retrying in {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                return self.scrape_user_data(username, retry_count + 1, max_retries)
-            return {"error": "Request timeout", "username": username}
+            self._record_fetch(fetch_started, "timeout")
+            self._pacer.on_throttle()
+            self._breaker.record_failure()
+            return {"error": ERROR_TIMEOUT, "username": username}, "timeout", None
             
         except requests.exceptions.ConnectionError:
-            if retry_count < max_retries:
-                wait_time = (2 ** retry_count) * random.uniform(2, 4)
-                print(f"Connection error for {username}. Retrying in {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                return self.scrape_user_data(username, retry_count + 1, max_retries)
-            return {"error": "Connection error", "username": username}
+            self._record_fetch(fetch_started, "connection_error")
+            self._breaker.record_failure()
+            return {"error": ERROR_CONNECTION, "username": username}, "connection_error", None
             
         except requests.exceptions.RequestException as e:
-            return {"error": f"Network error: {str(e)}", "username": username}
+            self._record_fetch(fetch_started, "error")
+            self._breaker.record_failure()
+            return {"error": f"Network error: {str(e)}", "username": username}, None, None
             
         except Exception as e:
-            return {"error": f"Unexpected error: {str(e)}", "username": username}
+            self._breaker.release()  # No-op if an outcome was already recorded (the circuit is no longer half-open)
+            return {"error": f"Unexpected error: {str(e)}", "username": username}, None, None
+
+    @staticmethod
+    def _record_fetch(started, status):
+        """Count one upstream outcome and, if the request went out, time it."""
+        metrics.inc("codechef_upstream_responses_total", status=status)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            metrics.observe("codechef_upstream_fetch_seconds", elapsed)
+            request_timer.add("upstream", elapsed)
+
+    def _reuse_profile(self, previous, username, fields=None):
+        """The stored profile, re-stamped, for a page that has not changed."""
+        profile = dict(select_fields(previous, fields), username=username)
+        profile["scraped_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        profile["success"] = True
+        return profile
+
+    @staticmethod
+    def _content_hash(html):
+        """Hash of the whole page.
+
+        The extractors fall back to markup anywhere in the page, so any
+        narrower region could change without changing the hash; only an
+        identical page is known to yield the same profile.
+        """
+        return hashlib.sha1(html.encode('utf-8', 'replace')).hexdigest()
+
+    def _read_page(self, response, username, fields=None):
+        """Read the page body incrementally, capped at ``max_page_bytes``.
+
+        Returns (html, found, truncated). As soon as the contest history
+        array has arrived the fast path is tried on what we have (cut at the
+        last tag boundary so no number is split across chunks); if that
+        yields every field in ``fields`` (default: all), each from a match
+        the rest of the page cannot override (see _final_on_prefix), the rest
+        of the page is never downloaded and ``found`` holds them. Otherwise
+        ``found`` is None and ``html`` is the page, or its first
+        ``max_page_bytes`` with ``truncated`` set.
+
+        Only the newly decoded text is searched for the markers (plus a short
+        overlap for matches split across chunks), and the body is joined and
+        tried once per new closing ``];`` (as soon as a tag boundary follows
+        it) rather than once per chunk.
+        """
+        fields = fields or PROFILE_FIELDS
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        parts = []
+        received = 0
+        scanned = 0  # Characters decoded so far
+        tail = ""  # End of the previous piece, for markers split across chunks
+        marker = -1  # Offset of "all_rating"
+        closing = tried = -1  # Offsets of the last "];" seen and the last one tried
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            received += len(chunk)
+            with request_timer.span("decode"):
+                piece = decoder.decode(chunk)
+                parts.append(piece)
+            if received >= self.max_page_bytes:
+                print(f"Profile page for {username} exceeds {self.max_page_bytes} bytes; parsing the first part only")
+                self.truncated_pages += 1
+                self.bytes_read += received
+                self._stop_reading(response)
+                return "".join(parts), None, True
+            if not self.fast_path:
+                continue
+            window, base = tail + piece, scanned - len(tail)
+            scanned += len(piece)
+            tail = window[-(len("all_rating") - 1):]
+            if marker == -1:
+                found_at = window.find("all_rating")
+                if found_at == -1:
+                    continue
+                marker = base + found_at
+            if closing == tried:
+                found_at = window.find("];", max(0, marker - base, tried + 2 - base))
+                if found_at == -1:
+                    continue
+                closing = base + found_at
+            if window.find(">", max(0, closing + 2 - base)) == -1:
+                continue  # The cut below would still drop the array's end
+            tried = closing
+            html = "".join(parts)
+            parts = [html]
+            html = html[:html.rfind(">") + 1]
+            with metrics.timer("codechef_parse_stage_seconds", span="fast_path", stage="fast_path"):
+                found = self._fast_extract(html, username, fields)
+            if len(found) == len(fields) and self._final_on_prefix(html, found):
+                self.early_stops += 1
+                self.bytes_read += received
+                self._stop_reading(response)
+                return html, found, False
+        self.bytes_read += received
+        parts.append(decoder.decode(b"", final=True))
+        return "".join(parts), None, False
+
+    def _final_on_prefix(self, html, found):
+        """True if the full page could not give a different ``found`` than this prefix.
+
+        Single-pattern fields take the leftmost match, which a longer page
+        keeps. The fallback chains do not: a later, higher-priority match
+        wins over the one found here, so they only count when the top
+        pattern matched.
+        """
+        if "problems_solved" in found and not PATTERNS.search(SOLVED_PATTERNS[0], html):
+            return False
+        if "contest_history" in found and not (found["contest_history"]
+                                               and PATTERNS.search(CONTEST_PATTERNS[0], html)):
+            return False
+        return True
+
+    def _stop_reading(self, response):
+        """Abandon the rest of the body, keeping the connection if the remainder is small."""
+        length = response.headers.get('Content-Length', '')
+        remaining = int(length) - response.raw.tell() if length.isdigit() else None
+        if remaining is not None and remaining <= STREAM_DRAIN_BYTES:
+            for _ in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                pass
+        else:
+            self.connections_dropped += 1
+        response.close()
+
+    def parse_profile(self, html, username, found=None, fields=None):
+        """Extract the profile fields from a downloaded profile page.
+
+        Only ``fields`` (default: all of PROFILE_FIELDS) are extracted and
+        returned. The raw-HTML fast path runs first (unless ``found`` already
+        holds its result); a BeautifulSoup tree is only built when some field
+        is still missing, and only those fields use it.
+        """
+        fields = fields or PROFILE_FIELDS
+        started = time.perf_counter()
+        self.profiles_parsed += 1
+        if found is None and self.fast_path:
+            with metrics.timer("codechef_parse_stage_seconds", span="fast_path", stage="fast_path"):
+                found = self._fast_extract(html, username, fields)
+        found = {} if found is None else found
+        missing = [field for field in fields if field not in found]
+        if missing:
+            self.dom_builds += 1
+            metrics.inc("codechef_fallback_total", path="dom_parse")
+            with metrics.timer("codechef_parse_stage_seconds", span="soup", stage="dom_build"):
+                soup = self._make_soup(html)
+                index = _DocumentIndex(soup) if self.single_pass else None
+            for field in missing:
+                with metrics.timer("codechef_extractor_seconds", span=f"extract_{field}", field=field):
+                    found[field] = self._extract_field(field, soup, html, username, index)
+
+        profile = {"username": username}
+        for field in fields:
+            profile[field] = found[field]
+        elapsed = time.perf_counter() - started
+        metrics.observe("codechef_parse_seconds", elapsed)
+        request_timer.add("parse", elapsed)
+        return profile
+
+    def _extract_field(self, field, soup, html, username, index=None):
+        """Run the DOM extractor chain for one profile field."""
+        if field == "full_name":
+            return self._get_full_name(soup, username, index)
+        if field == "rating":
+            return self._find_rating_near_label(soup, html, index) or "N/A"
+        if field == "global_rank":
+            return self._find_rank_by_label(soup, "Global Rank", index) or "N/A"
+        if field == "country_rank":
+            return self._get_country_rank(soup, index) or "N/A"
+        if field == "stars":
+            return self._get_stars(soup, index)
+        if field == "problems_solved":
+            return self._get_problems_solved(html, soup, index)
+        if field == "contest_history":
+            return self._extract_contest_details(soup, index)
+        raise ValueError(f"Unknown profile field: {field}")
+
+    # ---------------------------
+    #  Raw HTML Fast Path
+    # ---------------------------
+
+    def _fast_extract(self, html, username, fields=PROFILE_FIELDS):
+        """Pull whatever of ``fields`` the canonical markup gives us without a DOM.
+
+        Returns only the fields it is sure about; a field is omitted whenever
+        the DOM extractors could disagree (e.g. an unrated "0" rating, an
+        "Inactive" rank, or a display name equal to the handle).
+        """
+        found = {}
+
+        if "full_name" in fields:
+            m = PATTERNS.search("fast_full_name", html)
+            if m:
+                full_name = PATTERNS.get("parenthetical").sub('', html_lib.unescape(m.group(1)).strip()).strip()
+                if full_name and full_name.lower() != username.lower():
+                    found["full_name"] = full_name
+
+        if "rating" in fields:
+            m = PATTERNS.search("fast_rating", html)
+            if m:
+                found["rating"] = m.group(1)
+
+        if "global_rank" in fields:
+            m = PATTERNS.search("fast_global_rank", html)
+            if m:
+                found["global_rank"] = m.group(1)
+
+        if "country_rank" in fields:
+            m = PATTERNS.search("fast_country_rank", html)
+            if m:
+                found["country_rank"] = m.group(1)
+
+        if "stars" in fields:
+            m = PATTERNS.search("fast_star_block", html)
+            if m:
+                count = len(PATTERNS.findall("fast_star", m.group(1)))
+                if count:
+                    found["stars"] = f"{count}★"
+
+        if "problems_solved" in fields:
+            solved = self._problems_solved_from_text(html)
+            if solved is not None:
+                found["problems_solved"] = solved
+
+        if "contest_history" in fields:
+            contests = self._contests_from_text(html)
+            if contests is not None:
+                found["contest_history"] = contests
+
+        return found
+
+    def _make_soup(self, html):
+        return BeautifulSoup(html, self.parser)
 
     # ---------------------------
     #  Main Stats Extraction
     # ---------------------------
 
-    def _extract_main_stats(self, soup, html):
-        rating = self._find_rating_near_label(soup, html)
-        global_rank = self._find_rank_by_label(soup, "Global Rank")
-        country_rank = self._get_country_rank(soup)
+    # Every extractor takes an optional _DocumentIndex. With it, document-wide
+    # lookups (find/find_all/get_text) come from the single indexing pass;
+    # without it they scan the tree as before. The fallback order is the same.
+
+    def _extract_main_stats(self, soup, html, index=None):
+        rating = self._find_rating_near_label(soup, html, index)
+        global_rank = self._find_rank_by_label(soup, "Global Rank", index)
+        country_rank = self._get_country_rank(soup, index)
 
         rating = rating if rating else "N/A"
         global_rank = global_rank if global_rank else "N/A"
@@ -185,95 +866,123 @@ class CodeChefScraper:
         if not s:
             return None
         s = s.strip().replace(",", "").lstrip("#")
-        m = re.search(r"(-?\d+)", s)
+        m = PATTERNS.get("number").search(s)
         return m.group(1) if m else None
 
-    def _find_rating_near_label(self, soup, html):
-        label_nodes = soup.find_all(string=re.compile(r'CodeChef\s*Rating', re.I))
+    def _find_rating_near_label(self, soup, html, index=None):
+        if index:
+            label_nodes = index.labels["CodeChef Rating"]
+        else:
+            label_nodes = soup.find_all(string=PATTERNS.get("label_rating"))
         for node in label_nodes:
             parent = node.parent
             for prev in parent.find_previous_siblings(limit=6):
                 text = prev.get_text(" ", strip=True)
-                m = re.search(r'(^|\D)(\d{3,5})(\D|$)', text)
+                m = PATTERNS.search("rating_sibling_text", text)
                 if m:
                     return self._norm_num(m.group(2))
-                a = prev.find('a', string=re.compile(r'\d{3,5}'))
+                a = prev.find('a', string=PATTERNS.get("rating_sibling_anchor"))
+                PATTERNS.record("rating_sibling_anchor", a is not None)
                 if a:
                     return self._norm_num(a.get_text(strip=True))
             for prev in parent.find_all_previous(limit=20):
                 text = prev.get_text(" ", strip=True)
-                m = re.search(r'(^|\D)(\d{3,5})(\D|$)', text)
+                m = PATTERNS.search("rating_previous_text", text)
                 if m:
                     return self._norm_num(m.group(2))
-        el = soup.select_one(".rating-number, .rating-number h2, .rating")
+        if index:
+            el = index.rating_element
+        else:
+            el = soup.select_one(".rating-number, .rating-number h2, .rating")
         if el:
             r = self._norm_num(el.get_text(" ", strip=True))
             if r:
                 return r
-        m = re.search(r'"rating"\s*:\s*("?)(-?\d+)\1', html)
+        m = PATTERNS.search("rating_json", html)
         return m.group(2) if m else None
 
-    def _find_rank_by_label(self, soup, label_text):
-        nodes = soup.find_all(string=re.compile(label_text, re.I))
+    def _find_rank_by_label(self, soup, label_text, index=None):
+        if index and label_text in index.labels:
+            nodes = index.labels[label_text]
+        else:
+            nodes = soup.find_all(string=PATTERNS.get(PATTERNS.label(label_text)))
         for node in nodes:
             parent = node.parent
             for prev in parent.find_previous_siblings(limit=6):
-                a = prev.find('a', string=re.compile(r'[#]?\s*\d{1,7}'))
+                a = prev.find('a', string=PATTERNS.get("rank_sibling_anchor"))
+                PATTERNS.record("rank_sibling_anchor", a is not None)
                 if a:
                     return self._norm_num(a.get_text(strip=True))
                 text = prev.get_text(" ", strip=True)
-                m = re.search(r'(\d{1,7})', text)
+                m = PATTERNS.search("rank_sibling_text", text)
                 if m:
                     return self._norm_num(m.group(1))
             gp = parent.parent
             if gp:
-                a = gp.find('a', string=re.compile(r'[#]?\s*\d{1,7}'))
+                a = gp.find('a', string=PATTERNS.get("rank_parent_anchor"))
+                PATTERNS.record("rank_parent_anchor", a is not None)
                 if a:
                     return self._norm_num(a.get_text(strip=True))
-        text = soup.get_text(" ", strip=True)
-        m = re.search(rf'{label_text}[:\s#-]{{0,6}}([0-9,]{{1,7}})', text, re.I)
+        text = index.text(" ", strip=True) if index else soup.get_text(" ", strip=True)
+        m = PATTERNS.search(f"rank_text:{label_text}", text)
         return self._norm_num(m.group(1)) if m else None
 
-    def _get_full_name(self, soup, username):
+    def _get_full_name(self, soup, username, index=None):
         try:
-            header = soup.find('header', class_='user-details-container')
+            if index:
+                header = index.first('header', 'user-details-container')
+            else:
+                header = soup.find('header', class_='user-details-container')
             if header:
                 name_h1 = header.find('h1')
                 if name_h1:
                     full_name = name_h1.get_text(strip=True)
-                    full_name = re.sub(r'\([^)]*\)', '', full_name).strip()
+                    full_name = PATTERNS.get("parenthetical").sub('', full_name).strip()
                     if full_name and full_name.lower() != username.lower():
                         return full_name
-            name_elem = soup.find('h1', class_='h2-style')
+            if index:
+                name_elem = index.first('h1', 'h2-style')
+            else:
+                name_elem = soup.find('h1', class_='h2-style')
             if name_elem:
                 full_name = name_elem.get_text(strip=True)
-                full_name = re.sub(r'\([^)]*\)', '', full_name).strip()
+                full_name = PATTERNS.get("parenthetical").sub('', full_name).strip()
                 if full_name and full_name.lower() != username.lower():
                     return full_name
-            user_section = soup.find('section', class_='user-details')
+            if index:
+                user_section = index.first('section', 'user-details')
+            else:
+                user_section = soup.find('section', class_='user-details')
             if user_section:
                 h1 = user_section.find('h1')
                 if h1:
                     full_name = h1.get_text(strip=True)
-                    full_name = re.sub(r'\([^)]*\)', '', full_name).strip()
+                    full_name = PATTERNS.get("parenthetical").sub('', full_name).strip()
                     if full_name and full_name.lower() != username.lower():
                         return full_name
         except Exception:
             pass
         return "N/A"
 
-    def _get_country_rank(self, soup):
+    def _get_country_rank(self, soup, index=None):
         try:
-            rank_section = soup.find('div', class_='rating-ranks')
+            if index:
+                rank_section = index.first('div', 'rating-ranks')
+            else:
+                rank_section = soup.find('div', class_='rating-ranks')
             if rank_section:
                 links = rank_section.find_all('a')
                 for link in links:
                     text = link.get_text(strip=True)
                     if 'country' in text.lower():
-                        rank_match = re.search(r'(\d+)', text)
+                        rank_match = PATTERNS.search("country_link_digits", text)
                         if rank_match:
                             return rank_match.group(1)
-            label_node = soup.find(string=re.compile(r'Country Rank', re.IGNORECASE))
+            if index:
+                label_nodes = index.labels["Country Rank"]
+                label_node = label_nodes[0] if label_nodes else None
+            else:
+                label_node = soup.find(string=PATTERNS.get(PATTERNS.label("Country Rank")))
             if label_node:
                 parent = label_node.find_parent()
                 if parent:
@@ -281,15 +990,22 @@ class CodeChefScraper:
                         txt = elem.get_text(strip=True)
                         if txt.isdigit():
                             return txt
-            widgets = soup.find_all('div', class_='rating-widget')
+            if index:
+                widgets = index.all('div', 'rating-widget')
+            else:
+                widgets = soup.find_all('div', class_='rating-widget')
             for widget in widgets:
                 title = widget.find('div', class_='rating-title')
                 if title and 'country' in title.get_text().lower():
                     rn = widget.find('div', class_='rating-number')
                     if rn:
                         return rn.get_text(strip=True)
-            for strong in soup.find_all('strong'):
-                parent_text = strong.parent.get_text().lower() if strong.parent else ''
+            for strong in (index.strongs if index else soup.find_all('strong')):
+                if index:
+                    # Sibling <strong>s share a parent; compute its text once
+                    parent_text = index.element_text(strong.parent).lower() if strong.parent else ''
+                else:
+                    parent_text = strong.parent.get_text().lower() if strong.parent else ''
                 if 'country' in parent_text:
                     rk = strong.get_text(strip=True)
                     if rk.isdigit():
@@ -298,67 +1014,91 @@ class CodeChefScraper:
             pass
         return "N/A"
 
-    def _get_stars(self, soup):
+    def _get_stars(self, soup, index=None):
         try:
-            star_container = soup.find('div', class_='rating-star')
+            if index:
+                star_container = index.first('div', 'rating-star')
+            else:
+                star_container = soup.find('div', class_='rating-star')
             if star_container:
                 stars = star_container.find_all('span', class_='star')
                 if stars:
                     return f"{len(stars)}★"
-            text = soup.get_text()
-            match = re.search(r'(\d+)\s*★', text)
+            text = index.text() if index else soup.get_text()
+            match = PATTERNS.search("stars_text", text)
             if match:
                 return f"{match.group(1)}★"
             return "0★"
         except Exception:
             return "0★"
 
-    def _get_problems_solved(self, text, soup):
+    def _problems_solved_from_text(self, text):
+        """Solved count from the embedded JSON / label text, or None."""
+        for name in SOLVED_PATTERNS:
+            match = PATTERNS.search(name, text)
+            if match:
+                return int(match.group(1))
+        return None
+
+    def _get_problems_solved(self, text, soup, index=None):
         try:
-            patterns = [
-                r'"problemsSolved":\s*(\d+)',
-                r'"fully_solved":\s*(\d+)',
-                r'"problems_solved":\s*(\d+)',
-                r'Fully Solved.*?(\d+)',
-                r'Problems Solved.*?(\d+)',
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    return int(match.group(1))
-            solved_section = soup.find('section', class_='rating-data-section problems-solved')
+            solved = self._problems_solved_from_text(text)
+            if solved is not None:
+                return solved
+            if index:
+                solved_section = index.first('section', 'rating-data-section problems-solved')
+            else:
+                solved_section = soup.find('section', class_='rating-data-section problems-solved')
             if solved_section:
-                numbers = re.findall(r'\d+', solved_section.get_text())
+                numbers = PATTERNS.findall("solved_section_digits", solved_section.get_text())
                 if numbers:
                     return int(numbers[0])
             return 0
         except Exception:
             return 0
 
-    def _extract_contest_details(self, soup):
+    def _contests_from_text(self, html):
+        """Contest history straight from the raw page, or None if it can't be trusted.
+
+        Mirrors the script scan in _extract_contest_details over the whole
+        page: the first embedded array that yields contests wins. If a
+        contest variable is present but empty the history is []. If none is
+        present, or one fails to parse, the DOM path decides.
+        """
+        seen = False
+        for name in CONTEST_PATTERNS:
+            for match in PATTERNS.finditer(name, html):
+                seen = True
+                contests = []
+                try:
+                    self._append_contests(match.group(1), contests)
+                except Exception:
+                    return None
+                if contests:
+                    return sorted(contests, key=lambda x: x.get('date', ''), reverse=True)
+        return [] if seen else None
+
+    def _append_contests(self, raw, contests):
+        for contest in json.loads(raw):
+            contests.append({
+                "name": contest.get('name', 'N/A'),
+                "rating": contest.get('rating', contest.get('end_rating', 'N/A')),
+                "rank": contest.get('rank', 'N/A'),
+                "date": self._format_date(contest.get('end_date', contest.get('date', 'N/A')))
+            })
+
+    def _extract_contest_details(self, soup, index=None):
         contests = []
         try:
-            scripts = soup.find_all('script')
+            scripts = index.scripts if index else soup.find_all('script')
             for script in scripts:
                 if not script.string:
                     continue
-                patterns = [
-                    r'var\s+all_rating\s*=\s*(\[.*?\]);',
-                    r'rating_data\s*=\s*(\[.*?\]);',
-                    r'ratingData\s*:\s*(\[.*?\])',
-                ]
-                for pattern in patterns:
-                    match = re.search(pattern, script.string, re.DOTALL)
+                for name in CONTEST_PATTERNS:
+                    match = PATTERNS.search(name, script.string)
                     if match:
                         try:
-                            contest_list = json.loads(match.group(1))
-                            for contest in contest_list:
-                                contests.append({
-                                    "name": contest.get('name', 'N/A'),
-                                    "rating": contest.get('rating', contest.get('end_rating', 'N/A')),
-                                    "rank": contest.get('rank', 'N/A'),
-                                    "date": self._format_date(contest.get('end_date', contest.get('date', 'N/A')))
-                                })
+                            self._append_contests(match.group(1), contests)
                             if contests:
                                 break
                         except Exception:
@@ -379,57 +1119,2505 @@ class CodeChefScraper:
             return "N/A"
 
 
-# Single username endpoint (NO rate limiting - frontend handles it)
-@app.route('/api/codechef', methods=['GET'])
-def get_codechef_data():
-    username = request.args.get('username')
-    if not username:
-        return jsonify({"error": "Username is required"}), 400
+class _DocumentIndex:
+    """Every document-wide lookup the extractors need, from one tree walk.
 
-    # Create scraper with skip_rate_limit=True (frontend handles rate limiting)
-    scraper = CodeChefScraper(skip_rate_limit=True)
-    data = scraper.get_user_data(username)
-    return jsonify(data)
+    The legacy extractors each rescan the whole document (``find_all(string=...)``,
+    ``find_all('strong')``, ``get_text()``...). Walking ``soup.descendants``
+    once and bucketing what they look for makes those lookups dictionary
+    reads. Results match bs4's own semantics: document order, and a
+    ``class_`` filter matches one class or the full class attribute.
+    """
 
+    # find_all(string=...) label searches, keyed by the label the extractors use
+    LABELS = {
+        "CodeChef Rating": PATTERNS.get("label_rating"),
+        "Global Rank": PATTERNS.get(PATTERNS.label("Global Rank")),
+        "Country Rank": PATTERNS.get(PATTERNS.label("Country Rank")),
+    }
+    ANY_LABEL = PATTERNS.get("label_any")
 
-# Bulk processing endpoint (KEEPS rate limiting for safety)
-@app.route('/api/codechef/bulk', methods=['POST'])
-def get_bulk_codechef_data():
-    """Process multiple usernames with progress tracking."""
-    data = request.get_json()
-    
-    if not data or 'usernames' not in data:
-        return jsonify({"error": "usernames array is required"}), 400
-    
-    usernames = data['usernames']
-    if not isinstance(usernames, list):
-        return jsonify({"error": "usernames must be an array"}), 400
-    
-    if len(usernames) > 1000:
-        return jsonify({"error": "Maximum 1000 usernames per request"}), 400
-    
-    # Create scraper WITHOUT skipping rate limit (bulk needs protection)
-    scraper = CodeChefScraper(skip_rate_limit=False)
-    results = []
-    
-    for i, username in enumerate(usernames):
-        print(f"Processing {i+1}/{len(usernames)}: {username}")
-        result = scraper.get_user_data(username)
-        results.append(result)
-    
-    # Summary statistics
-    successful = sum(1 for r in results if r.get('success', False))
-    failed = len(results) - successful
-    
-    return jsonify({
-        "results": results,
-        "summary": {
-            "total": len(results),
-            "successful": successful,
-            "failed": failed,
-            "success_rate": f"{(successful/len(results)*100):.1f}%" if results else "0%"
-        }
-    })
+    # (tag, class) pairs the extractors look up with find()/find_all()
+    TAG_CLASSES = {
+        'header': ('user-details-container',),
+        'h1': ('h2-style',),
+        'section': ('user-details', 'rating-data-section problems-solved'),
+        'div': ('rating-ranks', 'rating-star', 'rating-widget'),
+    }
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.labels = {label: [] for label in self.LABELS}
+        self.strongs = []
+        self.scripts = []
+        self.rating_element = None  # First match of ".rating-number, .rating-number h2, .rating"
+        self._by_class = {}
+        self._text = {}
+        self._element_text = {}
+
+        for node in soup.descendants:
+            if isinstance(node, Tag):
+                name = node.name
+                if name == 'strong':
+                    self.strongs.append(node)
+                elif name == 'script':
+                    self.scripts.append(node)
+                classes = node.get('class')
+                if not classes:
+                    continue
+                if self.rating_element is None and ('rating-number' in classes or 'rating' in classes):
+                    self.rating_element = node
+                wanted = self.TAG_CLASSES.get(name)
+                if wanted:
+                    joined = " ".join(classes)
+                    for cls in wanted:
+                        if cls in classes or cls == joined:
+                            self._by_class.setdefault((name, cls), []).append(node)
+            elif isinstance(node, NavigableString) and self.ANY_LABEL.search(node):
+                for label, pattern in self.LABELS.items():
+                    if pattern.search(node):
+                        self.labels[label].append(node)
+
+    def first(self, name, cls):
+        """Equivalent of ``soup.find(name, class_=cls)``."""
+        nodes = self._by_class.get((name, cls))
+        return nodes[0] if nodes else None
+
+    def all(self, name, cls):
+        """Equivalent of ``soup.find_all(name, class_=cls)``."""
+        return self._by_class.get((name, cls), [])
+
+    def text(self, separator="", strip=False):
+        """``soup.get_text()``, computed at most once per argument set."""
+        key = (separator, strip)
+        if key not in self._text:
+            self._text[key] = self.soup.get_text(separator, strip=strip)
+        return self._text[key]
+
+    def element_text(self, element):
+        """``element.get_text()``, memoized per element."""
+        key = id(element)
+        if key not in self._element_text:
+            self._element_text[key] = element.get_text()
+        return self._element_text[key]
+
+
+class SessionRegistry:
+    """Process-wide pooled session and scraper registry.
+
+    Each gunicorn worker keeps one long-lived ``requests.Session`` so warm
+    lookups reuse an open keep-alive connection (no DNS/TCP/TLS setup).
+    Sockets idle longer than ``idle_timeout`` are closed before reuse, and
+    the session is rebuilt after a fork so workers never share sockets.
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK,
+                 idle_timeout=POOL_IDLE_TIMEOUT, base_url=None):
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.idle_timeout = idle_timeout
+        self.base_url = base_url or CODECHEF_BASE_URL
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._created_at = 0
+        self._last_used = 0
+        self._scrapers = {}
+        self.sessions_created = 0
+        self.idle_reaps = 0
+        self.checkouts = 0
+
+    def get_session(self):
+        """Return the shared session, reaping idle sockets first."""
+        with self._lock:
+            now = time.time()
+            if self._session is not None and self._pid != os.getpid():
+                # Inherited from the parent before fork - never reuse its sockets
+                self._session = None
+            if self._session is None:
+                self._session = CodeChefScraper._create_robust_session(self.pool_maxsize, self.pool_block)
+                self._pid = os.getpid()
+                self._created_at = now
+                self.sessions_created += 1
+            elif now - self._last_used > self.idle_timeout:
+                self._reap_idle()
+            self._last_used = now
+            self.checkouts += 1
+            return self._session
+
+    def _reap_idle(self):
+        # Closing the adapters drops pooled sockets but keeps the session
+        # (headers, cookies) usable; pools are recreated on the next request.
+        self._session.close()
+        self.idle_reaps += 1
+
+    def get_scraper(self, skip_rate_limit=False):
+        """Return the shared scraper for the given rate limit mode."""
+        with self._lock:
+            scraper = self._scrapers.get(skip_rate_limit)
+            if scraper is None:
+                scraper = CodeChefScraper(skip_rate_limit=skip_rate_limit, registry=self,
+                                          base_url=self.base_url)
+                self._scrapers[skip_rate_limit] = scraper
+            return scraper
+
+    def scrapers(self):
+        with self._lock:
+            return list(self._scrapers.values())
+
+    def _open_connections(self):
+        if self._session is None:
+            return 0
+        total = 0
+        for adapter in set(self._session.adapters.values()):
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None and pool.pool is not None:
+                    # The queue is pre-filled with None placeholders for unopened slots
+                    total += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return total
+
+    def health(self, probe=False):
+        """Report pool state; optionally probe the upstream over the shared session."""
+        with self._lock:
+            now = time.time()
+            if self._session is not None and now - self._last_used > self.idle_timeout:
+                self._reap_idle()
+            info = {
+                "pid": os.getpid(),
+                "session_active": self._session is not None,
+                "session_age_seconds": round(now - self._created_at, 1) if self._session else None,
+                "idle_seconds": round(now - self._last_used, 1) if self._session else None,
+                "pool_maxsize": self.pool_maxsize,
+                "pool_block": self.pool_block,
+                "idle_timeout": self.idle_timeout,
+                "idle_connections": self._open_connections(),
+                "sessions_created": self.sessions_created,
+                "idle_reaps": self.idle_reaps,
+                "checkouts": self.checkouts,
+            }
+        if probe:
+            start = time.time()
+            try:
+                response = self.get_session().head(self.base_url, timeout=5, allow_redirects=False)
+                info["upstream"] = {"ok": response.status_code < 500, "status": response.status_code,
+                                    "latency_ms": round((time.time() - start) * 1000, 1)}
+            except requests.exceptions.RequestException as e:
+                info["upstream"] = {"ok": False, "error": str(e),
+                                    "latency_ms": round((time.time() - start) * 1000, 1)}
+        return info
+
+
+# One registry per worker process, created at import (rebuilt lazily after fork)
+registry = SessionRegistry()
+
+
+# ---------------------------
+#  Profile Cache
+# ---------------------------
+
+def normalize_username(username):
+    """Cache key for a handle: CodeChef usernames are case-insensitive."""
+    return str(username).strip().lower()
+
+
+class ProfileCache:
+    """Thread-safe TTL + LRU cache for scraped profiles.
+
+    Bounded both by entry count and by an approximate byte budget (size of
+    the JSON-encoded profile); the least recently used entries go first.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 grace=SWR_GRACE):
+        self.ttl = ttl
+        self.grace = grace  # Expired entries are kept this long for stale-while-revalidate
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, stored_at, size)
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, allow_stale=False):
+        """Return (value, age_seconds) for a fresh entry, else None.
+
+        With ``allow_stale`` an expired entry still inside the grace window
+        is returned too; the caller compares the age against ``ttl``.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, size = entry
+            age = time.time() - stored_at
+            if age > self.ttl + self.grace:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if age > self.ttl and not allow_stale:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return value, age
+
+    def set(self, key, value, stored_at=None):
+        size = len(json.dumps(value))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, stored_at or time.time(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": f"{(self.hits/lookups*100):.1f}%" if lookups else "0%",
+            }
+
+
+profile_cache = ProfileCache()
+
+
+class ProfileStore:
+    """Scraped profiles persisted in SQLite (WAL mode).
+
+    Every gunicorn worker reads and writes the same file, so a profile
+    scraped by one worker (or before a deploy) is served by all of them
+    while it is younger than ``max_age``.
+    """
+
+    def __init__(self, db_path=STORE_DB_PATH, max_age=STORE_MAX_AGE, retention=STORE_RETENTION,
+                 grace=SWR_GRACE):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.grace = grace
+        self.retention = retention
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    username TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    scraped_at TEXT,
+                    fetched_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        yield conn
+
+    def get(self, key, allow_stale=False):
+        """Return (value, age_seconds) if a fresh enough copy is stored, else None.
+
+        ``allow_stale`` extends the limit by the stale-while-revalidate grace window.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT data, fetched_at FROM profiles WHERE username = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            age = time.time() - row[1]
+            if age > self.max_age + (self.grace if allow_stale else 0):
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), age
+
+    def validators(self, key):
+        """The last stored profile with its validators, whatever its age.
+
+        Returns a dict for CodeChefScraper.get_user_data (``data`` is None
+        when the handle has never been stored).
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, etag, last_modified, content_hash FROM profiles WHERE username = ?",
+                (key,)).fetchone()
+        if row is None:
+            return {"data": None}
+        return {"data": json.loads(row[0]), "etag": row[1], "last_modified": row[2], "content_hash": row[3]}
+
+    def set(self, key, value, validators=None):
+        validators = validators or {}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles (username, data, scraped_at, fetched_at, etag, last_modified, "
+                "content_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(value), value.get("scraped_at"), time.time(), validators.get("etag"),
+                 validators.get("last_modified"), validators.get("content_hash")))
+            with self._lock:
+                self.writes += 1
+                prune = self.writes % 500 == 0
+            if prune:
+                conn.execute("DELETE FROM profiles WHERE fetched_at < ?", (time.time() - self.retention,))
+
+    def clear(self):
+        """Delete every stored profile (and its validators). Returns the row count."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM profiles").rowcount
+
+    def stats(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        with self._lock:
+            return {
+                "path": self.db_path,
+                "rows": rows,
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "writes": self.writes,
+            }
+
+
+profile_store = ProfileStore() if STORE_DB_PATH else None
+
+
+class NegativeCache:
+    """Remember handles that do not exist or keep failing.
+
+    A 404 is cached straight away; other per-user failures are cached after
+    ``failure_threshold`` consecutive attempts. Entries live for their own,
+    shorter TTL so a fixed typo or a recovered profile is retried soon.
+    Upstream-wide failures (rate limits, IP blocks, connection errors,
+    timeouts, 5xx responses) say nothing about the username and are never
+    counted.
+    """
+
+    def __init__(self, ttl=NEGATIVE_TTL, failure_threshold=NEGATIVE_FAILURES,
+                 max_entries=NEGATIVE_MAX_ENTRIES):
+        self.failure_threshold = failure_threshold
+        self.max_entries = max_entries
+        self._entries = ProfileCache(ttl=ttl, max_entries=max_entries, grace=0)
+        self._lock = threading.Lock()
+        self._failures = OrderedDict()  # key -> consecutive failure count
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def record(self, key, data):
+        """Update the negative cache from a scrape result."""
+        if data.get('success', False):
+            with self._lock:
+                self._failures.pop(key, None)
+            return
+        error = data.get('error')
+        if is_upstream_wide(error):
+            return
+        if error == ERROR_NOT_FOUND:
+            self._entries.set(key, data)
+            return
+        with self._lock:
+            count = self._failures.pop(key, 0) + 1
+            self._failures[key] = count
+            while len(self._failures) > self.max_entries:
+                self._failures.popitem(last=False)
+        if count >= self.failure_threshold:
+            self._entries.set(key, dict(data, consecutive_failures=count))
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self._failures.clear()
+
+    def stats(self):
+        stats = self._entries.stats()
+        with self._lock:
+            stats["failure_threshold"] = self.failure_threshold
+            stats["tracked_failures"] = len(self._failures)
+        return stats
+
+
+negative_cache = NegativeCache()
+
+
+def cached_profile(username, allow_stale=False, record=True):
+    """Return a copy of the cached profile marked with its age, or None.
+
+    Checks this worker's memory cache first, then the shared on-disk store
+    (which another worker may have refreshed more recently), then the
+    negative cache. A copy is fresh for ``CACHE_TTL`` wherever it came from;
+    a stale memory copy is only replaced by a fresh stored one. Negative
+    cache hits are marked ``"negative_cached": true``. With
+    ``allow_stale`` a copy inside the grace window is returned marked
+    ``"stale": true``. ``record`` counts the lookup in the cache metrics.
+    """
+    key = normalize_username(username)
+    hit = profile_cache.get(key, allow_stale)
+    source = "memory"
+    if (hit is None or hit[1] > profile_cache.ttl) and profile_store is not None:
+        stored = profile_store.get(key, allow_stale)
+        if stored is not None and (hit is None or stored[1] < min(hit[1], profile_cache.ttl)):
+            hit = stored
+            source = "store"
+            profile_cache.set(key, stored[0], stored_at=time.time() - stored[1])
+    if hit is None:
+        negative = negative_cache.get(key)
+        if negative is not None:
+            value, age = negative
+            if record:
+                metrics.inc("codechef_cache_lookups_total", result="negative")
+            return dict(value, username=username, cached=True, negative_cached=True,
+                        cache_age_seconds=round(age, 1))
+        if record:
+            metrics.inc("codechef_cache_lookups_total", result="miss")
+        return None
+    value, age = hit
+    fresh_for = profile_cache.ttl if source == "memory" else min(profile_store.max_age, profile_cache.ttl)
+    if record:
+        metrics.inc("codechef_cache_lookups_total", result="stale" if age > fresh_for else f"hit_{source}")
+    # Echo the handle as requested; the cached copy may have been fetched with other casing
+    return dict(value, username=username, cached=True, cache_source=source,
+                cache_age_seconds=round(age, 1), stale=age > fresh_for)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller runs the function; callers arriving while it is still
+    running wait for that result instead of starting their own.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.bulk_duplicates = 0
+
+    def do(self, key, fn):
+        """Run ``fn`` once per key at a time. Returns (result, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            with request_timer.span("coalesced_wait"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def record_bulk_duplicates(self, count):
+        with self._lock:
+            self.bulk_duplicates += count
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "bulk_duplicates": self.bulk_duplicates,
+            }
+
+
+inflight = SingleFlight()
+
+
+class BackgroundRefresher:
+    """Refresh stale profiles off the request path with bounded concurrency.
+
+    At most ``concurrency`` refreshes run at once and at most ``max_pending``
+    are queued; a handle already queued is not queued again.
+    """
+
+    def __init__(self, concurrency=SWR_REFRESH_CONCURRENCY, max_pending=SWR_MAX_PENDING):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = None
+        self._pid = None
+        self.scheduled = 0
+        self.completed = 0
+        self.dropped = 0
+
+    def schedule(self, username, scraper):
+        """Queue a refresh for ``username``. Returns False if it was skipped."""
+        key = normalize_username(username)
+        with self._lock:
+            if key in self._pending:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix="swr-refresh")
+                self._pid = os.getpid()
+            self._pending.add(key)
+            self.scheduled += 1
+        self._executor.submit(self._refresh, key, username, scraper)
+        return True
+
+    def _refresh(self, key, username, scraper):
+        try:
+            lookup_profile(username, scraper, refresh=True, priority=PRIORITY_BULK)
+        except Exception as e:
+            print(f"Background refresh failed for {username}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "concurrency": self.concurrency,
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "dropped": self.dropped,
+            }
+
+
+refresher = BackgroundRefresher()
+
+
+def circuit_fallback(username):
+    """Best cached copy to serve while the circuit is open, marked stale, or None.
+
+    Anything inside the stale grace window first, then the last stored copy
+    of any age: an old profile beats an error during an outage.
+    """
+    cached = cached_profile(username, allow_stale=True, record=False)
+    if cached is not None and not cached.get('negative_cached'):
+        return dict(cached, stale=True, circuit_open=True)
+    if profile_store is None:
+        return None
+    stored = profile_store.validators(normalize_username(username))["data"]
+    if stored is None:
+        return None
+    return dict(stored, username=username, cached=True, cache_source="store", stale=True, circuit_open=True)
+
+
+def deadline_result(username):
+    """Result for a lookup that could not get an upstream token before its deadline."""
+    return {"error": ERROR_DEADLINE, "username": username, "deadline_exceeded": True, "cached": False}
+
+
+def lookup_profile(username, scraper, refresh=False, allow_stale=False, deadline=None,
+                   priority=PRIORITY_INTERACTIVE, fields=None):
+    """Serve a profile from the caches, scraping (and caching) it on a miss.
+
+    Concurrent misses for the same handle share one upstream fetch. With
+    ``allow_stale`` a stale copy inside the grace window is returned at
+    once and refreshed in the background. ``deadline`` (a ``time.time()``
+    value) bounds the scrape, retries included; ``priority`` is the class
+    its upstream tokens are taken in. A bulk lookup takes its first token
+    before it joins the in-flight fetches, so an interactive caller never
+    waits behind it for a bulk token. With ``fields`` only those profile
+    fields are returned, and a miss runs only their extractors; such a
+    partial profile is never cached, but a cached full one serves it.
+    Neither is one parsed from a truncated page.
+    """
+    if not refresh:
+        with request_timer.span("cache"):
+            cached = cached_profile(username, allow_stale)
+        if cached is not None:
+            if cached.get("stale"):
+                metrics.inc("codechef_fallback_total", path="stale_while_revalidate")
+                refresher.schedule(username, scraper)
+            return select_fields(cached, fields)
+
+    key = normalize_username(username)
+    reserved = False
+    if priority == PRIORITY_BULK and not scraper.skip_rate_limit and not scraper._breaker.rejecting():
+        with request_timer.span("rate_limit"):
+            if scraper._pacer.acquire(deadline - time.time() if deadline else None, PRIORITY_BULK) is None:
+                return deadline_result(username)
+        reserved = True
+
+    def fetch():
+        # The stored copy makes the refresh conditional: unchanged pages are not parsed again
+        with request_timer.span("store"):
+            validators = profile_store.validators(key) if profile_store is not None else None
+        data = scraper.get_user_data(username, validators, deadline, priority, fields, reserved)
+        negative_cache.record(key, data)
+        if data.get('success', False) and fields is None and not data.get('truncated'):
+            profile_cache.set(key, data)
+            if profile_store is not None:
+                with request_timer.span("store"):
+                    profile_store.set(key, data, validators)
+        return data
+
+    # Partial fetches only coalesce with identical field sets, never with a full one
+    flight_key = key if fields is None else f"{key}?fields={','.join(fields)}"
+    data, shared = inflight.do(flight_key, fetch)
+    if data.get('error') == ERROR_CIRCUIT_OPEN:
+        fallback = circuit_fallback(username)
+        if fallback is not None:
+            metrics.inc("codechef_fallback_total", path="circuit_open")
+            return select_fields(fallback, fields)
+    if shared:
+        return dict(data, username=username, cached=False, coalesced=True)
+    return dict(data, cached=False)
+
+
+# ---------------------------
+#  Upstream Pacing
+# ---------------------------
+
+class TokenBucket:
+    """Upstream request budget shared by every worker process on the host.
+
+    The bucket state lives in one SQLite row updated under ``BEGIN
+    IMMEDIATE``, so gunicorn workers (and every thread in them) draw from
+    the same ``rate`` requests per second with up to ``burst`` back to back.
+    Tokens may go negative: each caller reserves the next token and is told
+    how long to wait for it, so waiters queue in arrival order. With an empty
+    ``db_path`` the bucket is kept in memory for this process only.
+
+    With ``shared_rate`` the rate itself is stored in the row too, so an
+    ``AdaptivePacer`` in any worker retunes the whole host. The row also
+    records the configured ``rate`` it was seeded from: a restart with a
+    different one reseeds it, and a stored rate outside ``rate_bounds``
+    (the pacer's limits) is clamped back into them.
+
+    Tokens are handed out by priority class. Interactive callers queue as
+    above. Bulk callers never queue: they take a token only when one is
+    free, so they always yield to waiting interactive lookups, except that
+    bulk is granted at least ``bulk_min_share`` of the rate even while
+    interactive demand would use all of it. Such a grant goes ahead of the
+    queue (the interactive callers arriving after it wait one slot longer)
+    and the next one falls due a fixed period after it was due.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_RPS, burst=RATE_LIMIT_BURST, db_path=RATE_LIMIT_DB_PATH, name="codechef",
+                 shared_rate=False, bulk_min_share=BULK_MIN_SHARE):
+        self.rate = rate
+        self.configured_rate = rate
+        self.rate_bounds = None  # (min, max) for a shared rate; set by AdaptivePacer
+        self.burst = max(1.0, burst)
+        self.db_path = db_path
+        self.name = name
+        self.shared_rate = shared_rate
+        self.bulk_min_share = bulk_min_share
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memory = self._initial_state()
+        self.classes = {
+            priority: {"acquired": 0, "waited": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+        }
+        self.share_grants = 0  # Bulk tokens granted ahead of queued interactive callers
+        if db_path:
+            with self._connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS buckets (
+                        name TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        updated REAL NOT NULL,
+                        rate REAL,
+                        decreased REAL,
+                        bulk_granted REAL,
+                        base_rate REAL
+                    )""")
+
+    @contextmanager
+    def _connect(self):
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        yield conn
+
+    @contextmanager
+    def _state(self):
+        """Lock the bucket and yield its state, refilled up to now; changes are written back."""
+        if not self.db_path:
+            with self._lock:
+                state = self._settle(self._memory)
+                yield state
+                self._memory = state
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._settle(self._load(conn))
+                yield state
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated, rate, decreased, bulk_granted, base_rate) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.name, state["tokens"], state["updated"], state["rate"], state["decreased"],
+                     state["bulk_granted"], state["base_rate"]))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _initial_state(self):
+        return {"tokens": self.burst, "updated": time.time(), "rate": None, "decreased": 0.0, "bulk_granted": 0.0,
+                "base_rate": None}
+
+    def _load(self, conn):
+        state = self._initial_state()
+        row = conn.execute(
+            "SELECT tokens, updated, rate, decreased, bulk_granted, base_rate FROM buckets WHERE name = ?",
+            (self.name,)).fetchone()
+        if row:
+            state.update(tokens=row[0], updated=row[1], rate=row[2], decreased=row[3] or 0.0,
+                         bulk_granted=row[4] or 0.0, base_rate=row[5])
+        return state
+
+    def _settle(self, state):
+        """Refill ``state`` for the time elapsed since it was last updated."""
+        state = dict(state)
+        if not self.shared_rate:
+            state["rate"] = self.rate
+        elif state["rate"] is None or state["base_rate"] != self.configured_rate:
+            # First use, or the configured rate changed since the row was seeded
+            state["rate"] = state["base_rate"] = self.configured_rate
+        elif self.rate_bounds is not None:
+            state["rate"] = min(max(state["rate"], self.rate_bounds[0]), self.rate_bounds[1])
+        now = time.time()
+        elapsed = max(0.0, now - state["updated"])
+        state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+        state["updated"] = now
+        return state
+
+    def reserve(self, max_wait=None):
+        """Take the next interactive token and return the seconds to wait before using it.
+
+        If that wait would exceed ``max_wait`` no token is taken and None is
+        returned, so callers that give up never hold a place in the queue.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._state() as state:
+            rate = state["rate"]
+            wait = max(0.0, (1 - state["tokens"]) / rate)
+            if max_wait is None or wait <= max_wait:
+                state["tokens"] -= 1
+        with self._lock:
+            self.rate = rate
+        if max_wait is not None and wait > max_wait:
+            return None
+        self.record_wait(PRIORITY_INTERACTIVE, wait)
+        return wait
+
+    def try_reserve_bulk(self):
+        """Take a bulk token if one is free (or bulk's minimum share is due).
+
+        Returns (granted, wait). Granted: ``wait`` is 0 (a minimum-share
+        grant is not queued behind interactive callers). Not granted:
+        ``wait`` is when to ask again.
+        """
+        if self.rate <= 0:
+            return True, 0.0
+        forced = False
+        with self._state() as state:
+            now, rate = state["updated"], state["rate"]
+            period = 1.0 / (self.bulk_min_share * rate) if self.bulk_min_share > 0 else None
+            due = state["bulk_granted"] + period if period is not None else None
+            if state["tokens"] >= 1 or (due is not None and now >= due):
+                wait = 0.0
+                granted = True
+                forced = state["tokens"] < 1
+                state["tokens"] -= 1
+                # Keep the share's schedule, but don't bank grants missed while bulk was idle
+                on_schedule = due is not None and due <= now < due + period
+                state["bulk_granted"] = due if on_schedule else now
+            else:
+                wait = (1 - state["tokens"]) / rate
+                if due is not None:
+                    wait = min(wait, due - now)
+                granted = False
+        with self._lock:
+            self.rate = rate
+            if forced:
+                self.share_grants += 1
+        return granted, wait
+
+    def record_wait(self, priority, wait):
+        metrics.observe("codechef_rate_limit_wait_seconds", wait, priority=priority)
+        with self._lock:
+            counters = self.classes[priority]
+            counters["acquired"] += 1
+            if wait > 0:
+                counters["waited"] += 1
+                counters["wait_total"] += wait
+                counters["wait_max"] = max(counters["wait_max"], wait)
+
+    def acquire(self, max_wait=None, priority=PRIORITY_INTERACTIVE):
+        """Block until a token is available; returns the seconds spent queued.
+
+        Returns None straight away if the wait would exceed ``max_wait``
+        (a bulk caller gives up once it would).
+        """
+        if priority == PRIORITY_BULK:
+            return self._acquire_bulk(max_wait)
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return None
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def _acquire_bulk(self, max_wait=None):
+        started = time.time()
+        while True:
+            waited = time.time() - started
+            granted, wait = self.try_reserve_bulk()
+            if granted:
+                self.record_wait(PRIORITY_BULK, waited)
+                return waited
+            if max_wait is not None and waited + wait > max_wait:
+                return None  # Nothing was taken
+            time.sleep(wait)
+
+    def adjust(self, fn):
+        """Apply ``fn(state)`` to the bucket state atomically; returns the resulting state."""
+        with self._state() as state:
+            fn(state)
+            result = dict(state)
+        with self._lock:
+            self.rate = result["rate"]
+        return result
+
+    def snapshot(self):
+        """Current state (tokens go negative while callers are queued)."""
+        if not self.db_path:
+            with self._lock:
+                return self._settle(self._memory)
+        with self._connect() as conn:
+            return self._settle(self._load(conn))
+
+    def stats(self):
+        state = self.snapshot()
+        tokens, rate = state["tokens"], state["rate"]
+        with self._lock:
+            classes = {}
+            for priority, counters in self.classes.items():
+                acquired = counters["acquired"]
+                classes[priority] = {
+                    "acquired": acquired,
+                    "waited": counters["waited"],
+                    "wait_total_seconds": round(counters["wait_total"], 2),
+                    "wait_avg_ms": round(counters["wait_total"] / acquired * 1000, 1) if acquired else 0.0,
+                    "wait_max_ms": round(counters["wait_max"] * 1000, 1),
+                }
+            return {
+                "rate": round(rate, 3),
+                "burst": self.burst,
+                "shared_db": self.db_path or None,
+                "tokens": round(tokens, 2),
+                "queued_seconds": round(max(0.0, -tokens / rate), 2) if rate > 0 else 0.0,
+                "bulk_min_share": self.bulk_min_share,
+                "share_grants": self.share_grants,
+                "classes": classes,
+            }
+
+
+class AdaptivePacer:
+    """AIMD controller for the host-wide request rate.
+
+    Every healthy upstream response raises the bucket rate by ``increase``
+    requests per second, up to ``max_rate``; a 429, 403, 5xx or timeout
+    multiplies it by ``decrease``, down to ``min_rate``. Decreases are at
+    most one per ``cooldown`` seconds, so a burst of 429s from one overload
+    counts once. A Retry-After on a 429 also drains the bucket so nobody on
+    the host sends anything until it has passed.
+    """
+
+    def __init__(self, bucket, min_rate=PACING_MIN_RPS, max_rate=PACING_MAX_RPS, increase=PACING_INCREASE,
+                 decrease=PACING_DECREASE, cooldown=PACING_COOLDOWN, enabled=ADAPTIVE_PACING):
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.enabled = enabled and bucket.rate > 0
+        if self.enabled:
+            bucket.rate_bounds = (self.min_rate, self.max_rate)
+        self._lock = threading.Lock()
+        self.increases = 0
+        self.decreases = 0
+        self.throttles = 0
+
+    def acquire(self, max_wait=None, priority=PRIORITY_INTERACTIVE):
+        return self.bucket.acquire(max_wait, priority)
+
+    def on_success(self):
+        """The upstream answered normally: probe for more throughput."""
+        if not self.enabled:
+            return
+
+        def raise_rate(state):
+            state["rate"] = min(self.max_rate, max(self.min_rate, state["rate"] + self.increase))
+
+        self.bucket.adjust(raise_rate)
+        with self._lock:
+            self.increases += 1
+
+    def on_throttle(self, retry_after=None):
+        """The upstream pushed back: back off, and pause the host for ``retry_after`` seconds."""
+        with self._lock:
+            self.throttles += 1
+        if not self.enabled:
+            return
+        decreased = []
+
+        def cut_rate(state):
+            if state["updated"] - state["decreased"] >= self.cooldown:
+                state["rate"] = max(self.min_rate, state["rate"] * self.decrease)
+                state["decreased"] = state["updated"]
+                decreased.append(state["rate"])
+            if retry_after:
+                # Queue everyone behind the pause
+                state["tokens"] = min(state["tokens"], -retry_after * state["rate"])
+
+        self.bucket.adjust(cut_rate)
+        if decreased:
+            with self._lock:
+                self.decreases += 1
+            print(f"Upstream pushback: pacing down to {decreased[0]:.2f} req/s")
+
+    def stats(self):
+        state = self.bucket.snapshot()
+        with self._lock:
+            return {
+                "adaptive": self.enabled,
+                "rate": round(state["rate"], 3),
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+                "increase": self.increase,
+                "decrease": self.decrease,
+                "cooldown": self.cooldown,
+                "last_decrease_seconds_ago": round(time.time() - state["decreased"], 1) if state["decreased"] else None,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "throttles": self.throttles,
+            }
+
+
+# Every upstream fetch on this host draws from this bucket, retuned by the pacer
+rate_limiter = TokenBucket(shared_rate=ADAPTIVE_PACING)
+pacer = AdaptivePacer(rate_limiter)
+
+
+# ---------------------------
+#  Circuit Breaker
+# ---------------------------
+
+class CircuitBreaker:
+    """Stop calling the upstream while it is down or blocking us.
+
+    Closed: every call goes through and outcomes are recorded over the last
+    ``window`` calls. It opens after ``failure_threshold`` consecutive
+    failures, or when at least ``min_calls`` recent calls failed at
+    ``error_rate`` or more. Open: calls are rejected without touching the
+    network for ``open_seconds``. Half-open: one probe call is let through;
+    its success closes the circuit, its failure opens it again, and a probe
+    that ends without reaching the upstream is released for the next caller.
+
+    Failures are upstream-wide outcomes only (429, 403, 5xx, timeouts,
+    connection errors); a 404 is a healthy answer about one username.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURES, error_rate=CIRCUIT_ERROR_RATE, window=CIRCUIT_WINDOW,
+                 min_calls=CIRCUIT_MIN_CALLS, open_seconds=CIRCUIT_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_started = 0.0
+        self._probe_thread = None
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self):
+        """Whether a call may go to the upstream now (may move open -> half-open)."""
+        with self._lock:
+            now = time.time()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_started = 0.0
+            # Half-open: a single probe at a time (a lost probe is replaced after open_seconds)
+            if self._probe_started and now - self._probe_started < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._probe_started = now
+            self._probe_thread = threading.get_ident()
+            return True
+
+    def release(self):
+        """Give up this thread's half-open probe without an outcome (it never reached the upstream)."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probe_thread == threading.get_ident():
+                self._probe_started = 0.0
+                self._probe_thread = None
+
+    def rejecting(self):
+        """True while calls are being failed fast (no state change)."""
+        with self._lock:
+            return self.state == self.OPEN and time.time() - self.opened_at < self.open_seconds
+
+    def retry_after(self):
+        """Seconds until the next probe may go out."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.open_seconds - time.time())
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._outcomes.append(False)
+            if self.state == self.HALF_OPEN:
+                print("Upstream recovered: circuit closed")
+                self.state = self.CLOSED
+                self._outcomes.clear()
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._outcomes.append(True)
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            if self.state != self.CLOSED:
+                return
+            failures = sum(self._outcomes)
+            if (self.consecutive_failures >= self.failure_threshold or
+                    (len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate)):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        self.opens += 1
+        print(f"Upstream failing: circuit open for {self.open_seconds:.0f}s")
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(self._outcomes)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "recent_calls": calls,
+                "recent_error_rate": f"{(failures/calls*100):.1f}%" if calls else "0%",
+                "failure_threshold": self.failure_threshold,
+                "error_rate_threshold": self.error_rate,
+                "open_seconds": self.open_seconds,
+                "retry_after_seconds": round(max(0.0, self.opened_at + self.open_seconds - time.time()), 1)
+                if self.state == self.OPEN else 0.0,
+                "opens": self.opens,
+                "rejected": self.rejected,
+            }
+
+
+# One breaker per worker process around every upstream fetch
+circuit = CircuitBreaker()
+
+
+# ---------------------------
+#  Retry Policy
+# ---------------------------
+
+class RetryPolicy:
+    """The one place upstream retries are decided.
+
+    Each username gets at most ``max_attempts`` requests, and everything it
+    costs (token waits, requests, backoff sleeps) must fit in ``deadline``
+    seconds. Sleeps use decorrelated jitter: uniform between ``base_delay``
+    and three times the previous sleep, capped at ``max_delay``, so
+    concurrent callers that failed together do not retry together. The
+    session itself never retries.
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 deadline=RETRY_DEADLINE, history=50):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=history)  # Lookups that needed more than one attempt
+        self.calls = 0
+        self.attempts = 0
+        self.backoff_seconds = 0.0
+        self.deadline_exceeded = 0
+        self.gave_up = 0
+        self.retries_by_reason = {}
+        self.attempts_histogram = {}
+
+    def next_delay(self, previous):
+        """Decorrelated jitter backoff for the next retry."""
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def record(self, username, attempts, deadline_hit):
+        """Per-attempt telemetry for one lookup."""
+        with self._lock:
+            self.calls += 1
+            self.attempts += len(attempts)
+            self.attempts_histogram[len(attempts)] = self.attempts_histogram.get(len(attempts), 0) + 1
+            for attempt in attempts:
+                if "backoff_ms" in attempt:
+                    self.retries_by_reason[attempt["outcome"]] = self.retries_by_reason.get(attempt["outcome"], 0) + 1
+                    self.backoff_seconds += attempt["backoff_ms"] / 1000
+                    metrics.inc("codechef_retries_total", reason=attempt["outcome"])
+            if deadline_hit:
+                self.deadline_exceeded += 1
+                metrics.inc("codechef_deadline_exceeded_total")
+            if len(attempts) > 1:
+                if attempts[-1]["outcome"] != "ok":
+                    self.gave_up += 1
+                self._recent.append({"username": username, "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                     "attempts": attempts})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_attempts": self.max_attempts,
+                "base_delay": self.base_delay,
+                "max_delay": self.max_delay,
+                "deadline": self.deadline,
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "attempts_histogram": {str(k): v for k, v in sorted(self.attempts_histogram.items())},
+                "retries_by_reason": dict(self.retries_by_reason),
+                "backoff_seconds": round(self.backoff_seconds, 2),
+                "deadline_exceeded": self.deadline_exceeded,
+                "gave_up": self.gave_up,
+                "recent_retries": list(self._recent)[-10:],
+            }
+
+
+retry_policy = RetryPolicy()
+
+
+# ---------------------------
+#  Metrics
+# ---------------------------
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PARSE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "codechef_http_requests_total": ("counter", "API requests served, by route and status code", None),
+    "codechef_http_request_seconds": ("histogram", "API request latency by route (to the first byte for streams)",
+                                      LATENCY_BUCKETS),
+    "codechef_http_in_flight": ("gauge", "API requests being served", None),
+    "codechef_upstream_responses_total": ("counter", "Upstream profile fetches by status code, timeout or error",
+                                          None),
+    "codechef_upstream_fetch_seconds": ("histogram", "Upstream profile fetch latency, request and body read",
+                                        LATENCY_BUCKETS),
+    "codechef_upstream_in_flight": ("gauge", "Upstream profile fetches in progress", None),
+    "codechef_parse_seconds": ("histogram", "Time to parse one profile page", PARSE_BUCKETS),
+    "codechef_parse_stage_seconds": ("histogram", "Parse time by stage (regex fast path, DOM tree build)",
+                                     PARSE_BUCKETS),
+    "codechef_extractor_seconds": ("histogram", "DOM extractor time by profile field", PARSE_BUCKETS),
+    "codechef_rate_limit_wait_seconds": ("histogram", "Time queued for an upstream token, by priority class",
+                                         WAIT_BUCKETS),
+    "codechef_retries_total": ("counter", "Upstream retries by reason", None),
+    "codechef_deadline_exceeded_total": ("counter", "Lookups that ran out of their retry deadline", None),
+    "codechef_cache_lookups_total": ("counter", "Profile cache lookups by result", None),
+    "codechef_fallback_total": ("counter", "Slow or degraded paths taken (DOM parse, stale serve, circuit open)",
+                                None),
+    "codechef_bulk_queue_depth": ("gauge", "Bulk usernames queued or in flight", None),
+    "codechef_circuit_open": ("gauge", "Worker processes whose upstream circuit is open", None),
+    # Host-wide values, read when /metrics is scraped
+    "codechef_workers": ("gauge", "Worker processes reporting metrics", None),
+    "codechef_rate_limit_rps": ("gauge", "Current shared upstream request rate", None),
+    "codechef_bulk_job_items_pending": ("gauge", "Usernames left in queued and running bulk jobs", None),
+}
+
+
+class MetricsRegistry:
+    """Prometheus counters, gauges and histograms, merged across worker processes.
+
+    Each process records into memory (one lock, no I/O on the hot path) and a
+    background thread writes a snapshot of its series to one SQLite row every
+    ``flush_interval`` seconds. ``render()`` merges every row with this
+    process's live series: counters and histograms are summed over all
+    processes, including exited ones (so totals survive worker restarts for
+    ``retention`` seconds), gauges over processes that flushed recently. With
+    an empty ``db_path`` only this process is reported.
+    """
+
+    def __init__(self, definitions=METRICS, db_path=METRICS_DB_PATH, flush_interval=METRICS_FLUSH_INTERVAL,
+                 retention=METRICS_RETENTION, enabled=METRICS_ENABLED):
+        self.definitions = definitions
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._series = {}  # (name, labels) -> number, or [per-bucket counts..., +Inf count, sum]
+        self._collectors = []
+        self._pid = None
+        self._instance = None
+        if db_path and enabled:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS metrics (
+                        instance TEXT PRIMARY KEY,
+                        pid INTEGER NOT NULL,
+                        updated REAL NOT NULL,
+                        series TEXT NOT NULL
+                    )""")
+
+    @contextmanager
+    def _connect(self):
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        yield conn
+
+    def _ensure_process(self):
+        """Start from empty series, and the flusher, once per process (and again after fork). Lock held."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._instance = uuid.uuid4().hex
+        self._series = {}
+        if self.db_path:
+            threading.Thread(target=self._flusher, daemon=True).start()
+            atexit.register(self.flush)
+
+    def add_collector(self, fn):
+        """Call ``fn()`` before every snapshot, to set gauges read from other components."""
+        self._collectors.append(fn)
+
+    def inc(self, name, amount=1, **labels):
+        """Add ``amount`` to a counter, or to a gauge (negative to decrease it)."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._ensure_process()
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._ensure_process()
+            self._series[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        """Record ``value`` in a histogram."""
+        if not self.enabled:
+            return
+        buckets = self.definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._ensure_process()
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def timer(self, name, span=None, **labels):
+        """Time the block into a histogram (and into the request's ``span``, if given)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(name, elapsed, **labels)
+            if span:
+                request_timer.add(span, elapsed)
+
+    @contextmanager
+    def tracking(self, name, **labels):
+        """Hold a gauge one higher for the duration of the block."""
+        self.inc(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.inc(name, -1, **labels)
+
+    def _snapshot(self):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        with self._lock:
+            self._ensure_process()
+            series = {key: list(value) if isinstance(value, list) else value for key, value in self._series.items()}
+            return self._instance, series
+
+    def flush(self):
+        """Write this process's series to the shared table."""
+        if not self.db_path or not self.enabled:
+            return
+        instance, series = self._snapshot()
+        payload = json.dumps([[name, labels, value] for (name, labels), value in series.items()])
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO metrics (instance, pid, updated, series) VALUES (?, ?, ?, ?)",
+                         (instance, os.getpid(), time.time(), payload))
+
+    def _flusher(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Metrics flush failed: {e}")
+
+    def collect(self):
+        """Series merged over every process. Returns (series, live_processes)."""
+        instance, merged = self._snapshot()
+        if not self.db_path:
+            return merged, 1
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM metrics WHERE updated < ?", (now - self.retention,))
+            rows = conn.execute("SELECT updated, series FROM metrics WHERE instance != ?", (instance,)).fetchall()
+        live = 1
+        for updated, payload in rows:
+            alive = now - updated <= self.flush_interval * 3
+            live += alive
+            for name, labels, value in json.loads(payload):
+                if name not in self.definitions or (self.definitions[name][0] == "gauge" and not alive):
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                current = merged.get(key)
+                if current is None:
+                    merged[key] = value
+                elif isinstance(current, list):
+                    merged[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    merged[key] = current + value
+        return merged, live
+
+    def render(self, extra=None):
+        """Prometheus text exposition (format 0.0.4); ``extra`` maps names to host-wide gauge values."""
+        series, live = self.collect()
+        series[("codechef_workers", ())] = live
+        for name, value in (extra or {}).items():
+            series[(name, ())] = value
+        by_name = {}
+        for (name, labels), value in series.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text, buckets = self.definitions[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name]):
+                if kind != "histogram":
+                    lines.append(f"{name}{self._labels(labels)} {self._number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else self._number(bound)
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {self._number(value[-1])}")
+                lines.append(f"{name}_count{self._labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+                   for _, value in labels)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+    @staticmethod
+    def _number(value):
+        if isinstance(value, float):
+            return repr(round(value, 6))
+        return str(value)
+
+
+metrics = MetricsRegistry()
+metrics.add_collector(lambda: metrics.set("codechef_circuit_open", 1 if circuit.rejecting() else 0))
+
+
+@app.before_request
+def _track_request():
+    g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_started = time.perf_counter()
+    metrics.inc("codechef_http_in_flight", route=g.metrics_route)
+
+
+@app.after_request
+def _record_request(response):
+    route = g.get("metrics_route")
+    if route is not None:
+        metrics.inc("codechef_http_requests_total", route=route, status=str(response.status_code))
+        metrics.observe("codechef_http_request_seconds", time.perf_counter() - g.metrics_started, route=route)
+    return response
+
+
+@app.teardown_request
+def _finish_request(error=None):
+    route = g.get("metrics_route")
+    if route is not None:
+        metrics.inc("codechef_http_in_flight", -1, route=route)
+
+
+# ---------------------------
+#  Request Timing and Profiling
+# ---------------------------
+
+class RequestTimer:
+    """Where one request's time went, for the Server-Timing header and ``debug=timing``.
+
+    Spans are recorded on the thread serving the request (work handed to the
+    bulk pool is not attributed to it). A span recorded several times, such
+    as the upstream fetch of a retried lookup, accumulates its time and count.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.spans = OrderedDict()
+        self._local.started = time.perf_counter()
+
+    def end(self):
+        self._local.spans = None
+
+    def add(self, name, seconds):
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            return
+        span = spans.get(name)
+        if span is None:
+            spans[name] = [seconds, 1]
+        else:
+            span[0] += seconds
+            span[1] += 1
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def breakdown(self):
+        """{"total_ms": ..., "spans": {name: {"ms": ..., "count": ...}}} so far, or None outside a request."""
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            return None
+        return {
+            "total_ms": round((time.perf_counter() - self._local.started) * 1000, 2),
+            "spans": {name: {"ms": round(seconds * 1000, 2), "count": count}
+                      for name, (seconds, count) in spans.items()},
+        }
+
+    def header(self):
+        """Server-Timing header value for the current request."""
+        breakdown = self.breakdown()
+        if breakdown is None:
+            return None
+        entries = []
+        for name, span in breakdown["spans"].items():
+            entry = f"{name};dur={span['ms']}"
+            if span["count"] > 1:
+                entry += f';desc="{span["count"]}x"'
+            entries.append(entry)
+        entries.append(f"total;dur={breakdown['total_ms']}")
+        return ", ".join(entries)
+
+
+request_timer = RequestTimer()
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack every ``interval`` seconds into folded-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfiler:
+    """Opt-in profiling of a share of live requests, switched on and off at runtime.
+
+    Settings live in a small JSON file shared by every worker (written through
+    ``POST /api/codechef/profiling``) and are re-read when it changes, so
+    production can be profiled without a redeploy. A sampled request is
+    profiled with cProfile (``"format": "cprofile"``: a .prof file for pstats
+    or snakeviz) or by sampling its thread's stack every ``interval`` seconds
+    (``"format": "collapsed"``: folded stacks for flamegraph.pl or
+    speedscope). Profiles of requests faster than ``min_ms`` are dropped and
+    only the newest ``max_files`` are kept.
+    """
+
+    DEFAULTS = {"enabled": False, "sample_rate": 0.01, "format": "collapsed", "min_ms": 0.0}
+    FORMATS = ("cprofile", "collapsed")
+
+    def __init__(self, config_path=PROFILE_CONFIG_PATH, output_dir=PROFILE_DIR, max_files=PROFILE_MAX_FILES,
+                 interval=PROFILE_SAMPLE_INTERVAL):
+        self.config_path = config_path
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()  # cProfile profiles one request at a time per process
+        self._config = dict(self.DEFAULTS)
+        self._mtime = None
+        self._checked = 0.0
+        self.captured = 0
+        self.skipped_busy = 0
+
+    def config(self):
+        """Current settings, re-read from the shared file at most once a second."""
+        with self._lock:
+            now = time.time()
+            if now - self._checked < 1.0:
+                return self._config
+            self._checked = now
+            try:
+                mtime = os.stat(self.config_path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._mtime = mtime
+                config = dict(self.DEFAULTS)
+                if mtime is not None:
+                    try:
+                        with open(self.config_path) as f:
+                            config.update(self._validate(json.load(f)))
+                    except (OSError, ValueError) as e:
+                        print(f"Ignoring profiling settings in {self.config_path}: {e}")
+                self._config = config
+            return self._config
+
+    def _validate(self, changes):
+        if not isinstance(changes, dict):
+            raise ValueError("Profiling settings must be a JSON object")
+        unknown = set(changes) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown profiling settings: {', '.join(sorted(unknown))}")
+        valid = {}
+        if "enabled" in changes:
+            if not isinstance(changes["enabled"], bool):
+                raise ValueError("enabled must be true or false")
+            valid["enabled"] = changes["enabled"]
+        if "sample_rate" in changes:
+            rate = changes["sample_rate"]
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+                raise ValueError("sample_rate must be a number between 0 and 1")
+            valid["sample_rate"] = float(rate)
+        if "format" in changes:
+            if changes["format"] not in self.FORMATS:
+                raise ValueError(f"format must be one of: {', '.join(self.FORMATS)}")
+            valid["format"] = changes["format"]
+        if "min_ms" in changes:
+            min_ms = changes["min_ms"]
+            if isinstance(min_ms, bool) or not isinstance(min_ms, (int, float)) or min_ms < 0:
+                raise ValueError("min_ms must be a non-negative number")
+            valid["min_ms"] = float(min_ms)
+        return valid
+
+    def update(self, changes):
+        """Validate ``changes`` and write them for every worker. Returns the new settings.
+
+        Raises ValueError for invalid settings.
+        """
+        config = dict(self.config(), **self._validate(changes))
+        tmp_path = f"{self.config_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(config, f)
+        os.replace(tmp_path, self.config_path)  # Workers never see a half-written file
+        with self._lock:
+            self._checked = 0.0
+        return self.config()
+
+    def start(self):
+        """Start profiling the current request if it is sampled. Returns a handle for finish(), or None."""
+        config = self.config()
+        if not config["enabled"] or random.random() >= config["sample_rate"]:
+            return None
+        if config["format"] == "cprofile":
+            if not self._cprofile_lock.acquire(blocking=False):
+                with self._lock:
+                    self.skipped_busy += 1
+                return None
+            profile = cProfile.Profile()
+            profile.enable()
+            return "cprofile", profile, time.perf_counter()
+        sampler = _StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        return "collapsed", sampler, time.perf_counter()
+
+    def finish(self, handle, label):
+        """Stop profiling and write the profile. Returns its path, or None if it was too fast to keep."""
+        kind, profile, started = handle
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if kind == "cprofile":
+            profile.disable()
+            self._cprofile_lock.release()
+        else:
+            profile.stop()
+        if elapsed_ms < self.config()["min_ms"]:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}-{elapsed_ms:.0f}ms"
+        if kind == "cprofile":
+            path = os.path.join(self.output_dir, name + ".prof")
+            profile.dump_stats(path)
+        else:
+            path = os.path.join(self.output_dir, name + ".folded")
+            with open(path, "w") as f:
+                for stack, count in sorted(profile.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        with self._lock:
+            self.captured += 1
+        self._prune()
+        return path
+
+    def profiles(self, limit=50):
+        """The newest captured profiles (from every worker)."""
+        try:
+            entries = [entry for entry in os.scandir(self.output_dir)
+                       if entry.name.endswith((".prof", ".folded"))]
+        except OSError:
+            return []
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [{"file": entry.name, "bytes": entry.stat().st_size,
+                 "at": datetime.fromtimestamp(entry.stat().st_mtime).strftime("%Y-%m-%d %H:%M:%S")}
+                for entry in entries[:limit]]
+
+    def _prune(self):
+        try:
+            entries = sorted((entry for entry in os.scandir(self.output_dir)
+                              if entry.name.endswith((".prof", ".folded"))),
+                             key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:max(0, len(entries) - self.max_files)]:
+                os.remove(entry.path)
+        except OSError:
+            pass  # Another worker pruned the same file
+
+    def stats(self):
+        with self._lock:
+            return {"captured": self.captured, "skipped_busy": self.skipped_busy}
+
+
+profiler = RequestProfiler()
+
+
+@app.before_request
+def _start_request_timing():
+    # debug=timing asks for the breakdown in the body even with the header turned off
+    if SERVER_TIMING or request.args.get('debug') == 'timing':
+        request_timer.begin()
+    if request.path in PROFILED_ROUTES:
+        g.profile = profiler.start()
+
+
+@app.after_request
+def _add_server_timing(response):
+    header = request_timer.header() if SERVER_TIMING else None
+    if header:
+        response.headers['Server-Timing'] = header
+    return response
+
+
+@app.teardown_request
+def _finish_request_timing(error=None):
+    # After streamed bodies too, so a streaming bulk request is profiled to the end
+    request_timer.end()
+    handle = g.pop("profile", None)
+    if handle is not None:
+        try:
+            path = profiler.finish(handle, request.path.strip("/").replace("/", "_"))
+            if path:
+                print(f"Profile written to {path}")
+        except Exception as e:
+            print(f"Writing profile failed: {e}")
+
+
+# ---------------------------
+#  Bulk Fetch Engines
+# ---------------------------
+
+def iter_bulk_sync(usernames, scraper, deadline=None, fields=None):
+    """Yield (index, result) fetching one username at a time (original behaviour)."""
+    for i, username in enumerate(usernames):
+        print(f"Processing {i+1}/{len(usernames)}: {username}")
+        yield i, lookup_profile(username, scraper, deadline=deadline, priority=PRIORITY_BULK, fields=fields)
+
+
+class AsyncBulkFetcher:
+    """Fetch many profiles concurrently on an asyncio event loop.
+
+    Parsing stays in ``CodeChefScraper``; the blocking fetch+parse runs on a
+    thread pool sized to ``concurrency`` while the loop waits for bulk-class
+    tokens from the host-wide ``TokenBucket`` (asleep, so no thread is held
+    while queued, and interactive lookups go first). Throughput is therefore
+    bounded by the politeness budget rather than by one request's network
+    latency.
+    """
+
+    def __init__(self, scraper, concurrency=BULK_CONCURRENCY, budget=None, deadline=None, fields=None):
+        self.scraper = scraper
+        self.concurrency = max(1, concurrency)
+        self.budget = budget or rate_limiter
+        self.deadline = deadline  # time.time() limit for the whole run
+        self.fields = fields  # Profile fields to extract and return (None = all)
+        self._cancelled = threading.Event()
+
+    async def _fetch_one(self, index, username, total, semaphore, executor, emit):
+        async with semaphore:
+            if self._cancelled.is_set():
+                return
+            print(f"Processing {index+1}/{total}: {username}")
+            loop = asyncio.get_running_loop()
+            # Cache hits cost no upstream request, so they skip the budget (as do
+            # calls the open circuit or the expired deadline will fail fast).
+            # Both may read SQLite, so they run on the pool, not the loop.
+            result = await loop.run_in_executor(executor, cached_profile, username)
+            if result is not None:
+                result = select_fields(result, self.fields)
+            expired = self.deadline is not None and time.time() >= self.deadline
+            if result is None and (expired or self.scraper._breaker.rejecting()):
+                result = await loop.run_in_executor(executor, lookup_profile, username, self.scraper, True, False,
+                                                    self.deadline, PRIORITY_BULK, self.fields)
+            if result is None and not await self._wait_for_token():
+                # No token before the deadline: fail here rather than fetch without one
+                result = deadline_result(username)
+            if result is None:
+                # refresh=True: the cache was just checked above
+                result = await loop.run_in_executor(executor, lookup_profile, username, self.scraper, True, False,
+                                                    self.deadline, PRIORITY_BULK, self.fields)
+        emit(index, result)
+
+    async def _wait_for_token(self):
+        """Sleep on the loop until the bucket grants a bulk token.
+
+        Returns True once granted, or False (having taken nothing) as soon as
+        no token can come before the deadline.
+        """
+        started = time.time()
+        while True:
+            remaining = None if self.deadline is None else max(0.0, self.deadline - time.time())
+            granted, wait = self.budget.try_reserve_bulk()
+            if granted:
+                self.budget.record_wait(PRIORITY_BULK, time.time() - started)
+                return True
+            if remaining is not None and wait > remaining:
+                return False
+            await asyncio.sleep(wait)
+
+    async def run(self, usernames, emit):
+        """Fetch every username, calling ``emit(index, result)`` as each completes."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            await asyncio.gather(*(
+                self._fetch_one(i, username, len(usernames), semaphore, executor, emit)
+                for i, username in enumerate(usernames)
+            ))
+
+    def iter_results(self, usernames):
+        """Yield (index, result) in completion order from a loop on a background thread.
+
+        At most ``2 * concurrency`` results wait for the consumer; beyond that
+        the loop blocks, so a slow client holds back the fetches instead of
+        buffering the whole run in memory.
+        """
+        done = object()
+        results = queue.Queue(maxsize=2 * self.concurrency)
+
+        def put(item):
+            # Give up once the consumer has gone, or the loop thread would block forever
+            while not self._cancelled.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def runner():
+            try:
+                asyncio.run(self.run(usernames, lambda i, r: put((i, r))))
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        thread = threading.Thread(target=runner, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumer went away (e.g. client disconnected): skip remaining fetches
+            self._cancelled.set()
+
+
+def iter_bulk_results(usernames, engine=BULK_ENGINE, deadline=None, fields=None):
+    """Yield (index, result) pairs for a bulk run using the selected engine.
+
+    Duplicate handles in ``usernames`` are fetched once and the result is
+    fanned out to every index that asked for them. Past ``deadline`` (a
+    ``time.time()`` value) the remaining uncached handles fail fast. With
+    ``fields`` every result carries only those profile fields.
+    """
+    groups = OrderedDict()
+    for i, username in enumerate(usernames):
+        groups.setdefault(normalize_username(username), []).append(i)
+    indexes = list(groups.values())
+    unique = [usernames[group[0]] for group in indexes]
+    if len(unique) < len(usernames):
+        inflight.record_bulk_duplicates(len(usernames) - len(unique))
+
+    if engine == "sync":
+        # Shared scraper WITHOUT skipping rate limit (bulk needs protection)
+        results = iter_bulk_sync(unique, registry.get_scraper(skip_rate_limit=False), deadline, fields)
+    else:
+        # The async engine reserves its tokens on the event loop instead
+        fetcher = AsyncBulkFetcher(registry.get_scraper(skip_rate_limit=True), deadline=deadline, fields=fields)
+        results = fetcher.iter_results(unique)
+
+    queued = len(unique)
+    metrics.inc("codechef_bulk_queue_depth", queued)
+    try:
+        for j, result in results:
+            queued -= 1
+            metrics.inc("codechef_bulk_queue_depth", -1)
+            first = indexes[j][0]
+            yield first, result
+            for i in indexes[j][1:]:
+                yield i, dict(result, username=usernames[i])
+    finally:
+        metrics.inc("codechef_bulk_queue_depth", -queued)
+        results.close()
+
+
+# Single username endpoint (paced by the host-wide token bucket)
+@app.route('/api/codechef', methods=['GET'])
+def get_codechef_data():
+    username = request.args.get('username')
+    if not username:
+        return jsonify({"error": "Username is required"}), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+    allow_stale = request.args.get('allow_stale', '1' if SWR_DEFAULT else '0').lower() in ('1', 'true', 'yes')
+
+    # Shared scraper; upstream fetches wait for a token from the host-wide bucket
+    scraper = registry.get_scraper(skip_rate_limit=False)
+    data = lookup_profile(username, scraper, refresh=refresh, allow_stale=allow_stale, fields=fields)
+    if request.args.get('debug') == 'timing':
+        data = dict(data, timing=request_timer.breakdown())
+    response = jsonify(data)
+    if data.get('negative_cached'):
+        response.headers['X-Cache'] = 'NEGATIVE'
+    elif data.get('stale'):
+        response.headers['X-Cache'] = 'STALE'
+    else:
+        response.headers['X-Cache'] = 'HIT' if data.get('cached') else 'MISS'
+    return response
+
+
+def summarize_results(total, successful):
+    """Summary block shared by the bulk endpoint and bulk jobs."""
+    return {
+        "total": total,
+        "successful": successful,
+        "failed": total - successful,
+        "success_rate": f"{(successful/total*100):.1f}%" if total else "0%"
+    }
+
+
+# ---------------------------
+#  Background Bulk Jobs
+# ---------------------------
+
+class BulkJobManager:
+    """Run bulk lookups as background jobs checkpointed to SQLite.
+
+    Every finished username is written to ``job_items`` as it completes, so a
+    restart (or another gunicorn worker) picks the job up from the first
+    unfinished username. Ownership is a heartbeat lease: a job whose owner
+    stops heartbeating for ``lease_seconds`` is claimed by the next monitor
+    sweep in any worker process.
+    """
+
+    def __init__(self, db_path=JOBS_DB_PATH, workers=JOB_WORKERS, lease_seconds=JOB_LEASE_SECONDS,
+                 retention_seconds=JOB_RETENTION_SECONDS):
+        self.db_path = db_path
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._active = set()  # Job IDs running in this process
+        self._init_db()
+
+    @property
+    def owner(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    owner TEXT,
+                    heartbeat REAL,
+                    created_at REAL NOT NULL,
+                    finished_at REAL,
+                    error TEXT,
+                    deadline REAL,
+                    fields TEXT  -- Comma-separated field selection; NULL = every field
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    username TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    PRIMARY KEY (job_id, idx)
+                )""")
+
+    def _ensure_started(self):
+        """Start the worker pool and monitor once per process (and again after fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._active = set()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-job")
+            threading.Thread(target=self._monitor, daemon=True).start()
+
+    def submit(self, usernames, engine=BULK_ENGINE, deadline_seconds=JOB_DEADLINE, fields=None):
+        """Persist a new job and queue it on this process. Returns the job ID."""
+        self._ensure_started()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.execute(
+                "INSERT INTO jobs (id, status, engine, total, owner, heartbeat, created_at, deadline, fields) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, engine, len(usernames), self.owner, now, now, now + deadline_seconds,
+                 ",".join(fields) if fields else None))
+            conn.executemany(
+                "INSERT INTO job_items (job_id, idx, username) VALUES (?, ?, ?)",
+                [(job_id, i, str(username)) for i, username in enumerate(usernames)])
+            conn.execute("COMMIT")
+        self._schedule(job_id)
+        return job_id
+
+    def _schedule(self, job_id):
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _claim(self, conn, job_id):
+        now = time.time()
+        cur = conn.execute(
+            "UPDATE jobs SET owner = ?, heartbeat = ?, status = 'running' "
+            "WHERE id = ? AND status IN ('queued', 'running') "
+            "AND (owner = ? OR owner IS NULL OR heartbeat < ?)",
+            (self.owner, now, job_id, self.owner, now - self.lease_seconds))
+        return cur.rowcount == 1
+
+    def _run(self, job_id):
+        try:
+            with self._connect() as conn:
+                if not self._claim(conn, job_id):
+                    return
+                job = conn.execute("SELECT engine, deadline, fields FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                pending = conn.execute(
+                    "SELECT idx, username FROM job_items WHERE job_id = ? AND done = 0 ORDER BY idx",
+                    (job_id,)).fetchall()
+                print(f"Job {job_id}: {len(pending)} username(s) left")
+
+                indexes = [row["idx"] for row in pending]
+                usernames = [row["username"] for row in pending]
+                fields = parse_fields(job["fields"])
+                for i, result in iter_bulk_results(usernames, job["engine"], job["deadline"], fields):
+                    # Checkpoint each result as soon as it arrives
+                    conn.execute(
+                        "UPDATE job_items SET done = 1, success = ?, result = ? WHERE job_id = ? AND idx = ?",
+                        (1 if result.get('success', False) else 0, json.dumps(result), job_id, indexes[i]))
+                    conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+                conn.execute("UPDATE jobs SET status = 'completed', finished_at = ? WHERE id = ?",
+                             (time.time(), job_id))
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            with self._connect() as conn:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                             (str(e), time.time(), job_id))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _monitor(self):
+        """Keep our leases alive, resume abandoned jobs and prune old ones."""
+        while True:
+            try:
+                self.resume_pending()
+            except Exception as e:
+                print(f"Job monitor error: {e}")
+            time.sleep(max(1.0, self.lease_seconds / 3))
+
+    def resume_pending(self):
+        now = time.time()
+        with self._lock:
+            active = list(self._active)
+        with self._connect() as conn:
+            conn.executemany("UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ?",
+                             [(now, job_id, self.owner) for job_id in active])
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') "
+                "AND (owner IS NULL OR heartbeat < ?)",
+                (now - self.lease_seconds,)).fetchall()
+            expired = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (now - self.retention_seconds,)).fetchall()]
+            for job_id in expired:
+                conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        for row in rows:
+            print(f"Resuming job {row['id']}")
+            self._schedule(row["id"])
+
+    def pending_items(self):
+        """Usernames still to fetch across every queued or running job."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM job_items JOIN jobs ON jobs.id = job_items.job_id "
+                "WHERE jobs.status IN ('queued', 'running') AND job_items.done = 0").fetchone()[0]
+
+    def get(self, job_id, offset=0, limit=None):
+        """Job status with progress and the finished results from ``offset`` on."""
+        self._ensure_started()
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = conn.execute(
+                "SELECT COUNT(*) AS completed, COALESCE(SUM(success), 0) AS successful "
+                "FROM job_items WHERE job_id = ? AND done = 1", (job_id,)).fetchone()
+            rows = conn.execute(
+                "SELECT idx, result FROM job_items WHERE job_id = ? AND done = 1 AND idx >= ? "
+                "ORDER BY idx LIMIT ?",
+                (job_id, offset, -1 if limit is None else limit)).fetchall()
+
+        completed, successful = counts["completed"], counts["successful"]
+        info = {
+            "job_id": job_id,
+            "status": job["status"],
+            "engine": job["engine"],
+            "progress": {
+                "total": job["total"],
+                "completed": completed,
+                "percent": round(completed / job["total"] * 100, 1) if job["total"] else 100.0,
+            },
+            "created_at": datetime.fromtimestamp(job["created_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "results": [dict(json.loads(row["result"]), index=row["idx"]) for row in rows],
+            "summary": summarize_results(completed, successful),
+        }
+        if job["fields"]:
+            info["fields"] = job["fields"].split(",")
+        if job["deadline"]:
+            info["deadline_at"] = datetime.fromtimestamp(job["deadline"]).strftime("%Y-%m-%d %H:%M:%S")
+        if job["finished_at"]:
+            info["finished_at"] = datetime.fromtimestamp(job["finished_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        if job["error"]:
+            info["error"] = job["error"]
+        return info
+
+
+bulk_jobs = BulkJobManager()
+
+
+@app.before_request
+def _start_bulk_jobs():
+    # Boot the monitor on a worker's first request, not its first bulk call,
+    # so checkpointed jobs from a restarted worker are picked up promptly.
+    bulk_jobs._ensure_started()
+
+
+# Bulk processing endpoint (KEEPS rate limiting for safety)
+@app.route('/api/codechef/bulk', methods=['POST'])
+def get_bulk_codechef_data():
+    """Process multiple usernames with progress tracking."""
+    data = request.get_json()
+    
+    if not data or 'usernames' not in data:
+        return jsonify({"error": "usernames array is required"}), 400
+    
+    usernames = data['usernames']
+    if not isinstance(usernames, list):
+        return jsonify({"error": "usernames must be an array"}), 400
+    
+    if len(usernames) > 1000:
+        return jsonify({"error": "Maximum 1000 usernames per request"}), 400
+
+    engine = data.get('engine', BULK_ENGINE)
+    if engine not in ('async', 'sync'):
+        return jsonify({"error": "engine must be 'async' or 'sync'"}), 400
+
+    mode = data.get('mode', 'wait')
+    if mode not in ('wait', 'job', 'ndjson', 'sse'):
+        return jsonify({"error": "mode must be 'wait', 'job', 'ndjson' or 'sse'"}), 400
+
+    deadline_seconds = data.get('deadline_seconds', JOB_DEADLINE if mode == 'job' else BULK_DEADLINE)
+    max_deadline = max(JOB_DEADLINE, BULK_DEADLINE)
+    if (not isinstance(deadline_seconds, (int, float)) or isinstance(deadline_seconds, bool)
+            or not 0 < deadline_seconds <= max_deadline):  # Also rejects NaN and Infinity
+        return jsonify({"error": f"deadline_seconds must be a number in (0, {max_deadline:g}]"}), 400
+    deadline = time.time() + deadline_seconds
+
+    try:
+        fields = parse_fields(data.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if mode in ('ndjson', 'sse'):
+        return stream_bulk_results(usernames, engine, mode, deadline, fields)
+
+    if mode == 'job':
+        # Return immediately; progress is polled via GET /api/codechef/bulk/<job_id>
+        job_id = bulk_jobs.submit(usernames, engine, deadline_seconds, fields)
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "total": len(usernames),
+            "status_url": f"/api/codechef/bulk/{job_id}"
+        }), 202
+
+    # Results come back in completion order; keep them in request order
+    results = [None] * len(usernames)
+    for i, result in iter_bulk_results(usernames, engine, deadline, fields):
+        results[i] = result
+    
+    # Summary statistics
+    successful = sum(1 for r in results if r.get('success', False))
+
+    return jsonify({
+        "results": results,
+        "summary": summarize_results(len(results), successful)
+    })
+
+
+def stream_bulk_results(usernames, engine, mode, deadline=None, fields=None):
+    """Stream each profile as soon as it is fetched, then a final summary record.
+
+    Only the running counts are held in memory, so a 1000-user batch costs
+    the same as a single lookup and the first result arrives after one fetch.
+    """
+    def encode(kind, payload):
+        if mode == 'sse':
+            return f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({"type": kind, **payload}) + "\n"
+
+    def generate():
+        completed = 0
+        successful = 0
+        for i, result in iter_bulk_results(usernames, engine, deadline, fields):
+            completed += 1
+            if result.get('success', False):
+                successful += 1
+            yield encode("result", {"index": i, "data": result})
+        yield encode("summary", {"summary": summarize_results(completed, successful)})
+
+    mimetype = 'text/event-stream' if mode == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Don't let reverse proxies buffer the stream
+    })
+
+
+# Bulk job status / partial results
+@app.route('/api/codechef/bulk/<job_id>', methods=['GET'])
+def get_bulk_job(job_id):
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+
+    info = bulk_jobs.get(job_id, offset=offset, limit=limit)
+    if info is None:
+        return jsonify({"error": "Job not found", "job_id": job_id}), 404
+    return jsonify(info)
+
+
+# Pool / session health check
+@app.route('/api/codechef/health', methods=['GET'])
+def get_health():
+    probe = request.args.get('probe', '').lower() in ('1', 'true', 'yes')
+    if probe:
+        # The probe sends a real upstream request outside the pacer: admins only
+        denied = admin_denied()
+        if denied:
+            return denied
+    info = registry.health(probe=probe and not circuit.rejecting())
+    info["circuit"] = circuit.stats()
+    status = 200 if info.get("upstream", {}).get("ok", True) else 503
+    return jsonify(info), status
+
+
+def parser_stats():
+    scrapers = registry.scrapers()
+    parsed = sum(s.profiles_parsed for s in scrapers)
+    dom_builds = sum(s.dom_builds for s in scrapers)
+    return {
+        "backend": HTML_PARSER,
+        "fast_path": FAST_PATH,
+        "profiles_parsed": parsed,
+        "dom_builds": dom_builds,
+        "fast_path_only": parsed - dom_builds,
+        "stream": {
+            "enabled": STREAM_FETCH,
+            "max_page_bytes": MAX_PAGE_BYTES,
+            "bytes_read": sum(s.bytes_read for s in scrapers),
+            "early_stops": sum(s.early_stops for s in scrapers),
+            "truncated_pages": sum(s.truncated_pages for s in scrapers),
+            "connections_dropped": sum(s.connections_dropped for s in scrapers),
+        },
+        "conditional": {
+            "not_modified": sum(s.not_modified for s in scrapers),
+            "unchanged_pages": sum(s.unchanged_pages for s in scrapers),
+        },
+    }
+
+
+# Cache / engine statistics
+@app.route('/api/codechef/stats', methods=['GET'])
+def get_stats():
+    return jsonify({
+        "pid": os.getpid(),
+        "cache": profile_cache.stats(),
+        "store": profile_store.stats() if profile_store is not None else None,
+        "coalescing": inflight.stats(),
+        "revalidation": refresher.stats(),
+        "negative_cache": negative_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "pacing": pacer.stats(),
+        "circuit": circuit.stats(),
+        "retries": retry_policy.stats(),
+        "parser": parser_stats(),
+        "patterns": PATTERNS.stats(),
+    })
+
+
+@app.route('/api/codechef/pacing', methods=['GET'])
+def get_pacing():
+    """Current shared request rate and the AIMD controller's state."""
+    return jsonify({"pacing": pacer.stats(), "rate_limit": rate_limiter.stats()})
+
+
+# Prometheus scrape target (every worker's series, merged)
+@app.route('/metrics', methods=['GET'])
+@app.route('/api/codechef/metrics', methods=['GET'])
+def get_metrics():
+    body = metrics.render({
+        "codechef_rate_limit_rps": rate_limiter.snapshot()["rate"],
+        "codechef_bulk_job_items_pending": bulk_jobs.pending_items(),
+    })
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+def admin_denied():
+    """403 response unless the request carries the admin token, or None.
+
+    Fails closed: without CODECHEF_ADMIN_TOKEN configured every admin
+    request is refused.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (CODECHEF_ADMIN_TOKEN is not set)"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({"error": "Admin token required"}), 403
+    return None
+
+
+# Runtime profiling switch (shared by every worker)
+@app.route('/api/codechef/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    denied = admin_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        try:
+            profiler.update(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "config": profiler.config(),
+        "output_dir": profiler.output_dir,
+        "worker": dict(profiler.stats(), pid=os.getpid()),
+        "profiles": profiler.profiles(),
+    })
+
+
+@app.route('/api/codechef/cache/clear', methods=['POST'])
+def clear_cache():
+    denied = admin_denied()
+    if denied:
+        return denied
+    profile_cache.clear()
+    negative_cache.clear()
+    stored = profile_store.clear() if profile_store is not None else 0
+    return jsonify({"message": "Cache cleared successfully",
+                    "cleared": ["memory", "negative"] + (["store"] if profile_store is not None else []),
+                    "store_rows_deleted": stored,
+                    "worker_pid": os.getpid(),
+                    "note": "Memory and negative caches were cleared on this worker only"})
 
 
 if __name__ == "__main__":
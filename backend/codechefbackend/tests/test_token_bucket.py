@@ -0,0 +1,64 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CODECHEF_RATE_LIMIT_DB", "")
+os.environ.setdefault("CODECHEF_STORE_DB", "")
+os.environ.setdefault("CODECHEF_METRICS_DB", "")
+
+import sb  # noqa: E402
+
+
+class TokenBucketPriorityTest(unittest.TestCase):
+    def test_bulk_takes_free_tokens(self):
+        bucket = sb.TokenBucket(rate=10, burst=3, db_path="", bulk_min_share=0)
+        self.assertEqual(bucket.try_reserve_bulk(), (True, 0.0))
+        self.assertEqual(bucket.share_grants, 0)
+
+    def test_bulk_yields_to_queued_interactive_callers(self):
+        bucket = sb.TokenBucket(rate=10, burst=1, db_path="", bulk_min_share=0)
+        for _ in range(5):
+            bucket.reserve()
+        granted, wait = bucket.try_reserve_bulk()
+        self.assertFalse(granted)
+        self.assertGreater(wait, 0.3)
+
+    def test_min_share_grant_goes_ahead_of_the_queue(self):
+        bucket = sb.TokenBucket(rate=10, burst=1, db_path="", bulk_min_share=0.2)
+        for _ in range(20):
+            bucket.reserve()
+        self.assertEqual(bucket.try_reserve_bulk(), (True, 0.0))  # Due straight away
+        self.assertEqual(bucket.share_grants, 1)
+        granted, wait = bucket.try_reserve_bulk()
+        self.assertFalse(granted)
+        self.assertAlmostEqual(wait, 0.5, delta=0.05)  # One share period (1 / (0.2 * 10))
+
+    def test_min_share_holds_under_saturating_interactive_load(self):
+        bucket = sb.TokenBucket(rate=50, burst=1, db_path="", bulk_min_share=0.2)
+        stop = time.time() + 2
+        counts = {sb.PRIORITY_INTERACTIVE: 0, sb.PRIORITY_BULK: 0}
+        lock = threading.Lock()
+
+        def worker(priority):
+            while time.time() < stop:
+                bucket.acquire(priority=priority)
+                if time.time() <= stop:
+                    with lock:
+                        counts[priority] += 1
+
+        threads = [threading.Thread(target=worker, args=(sb.PRIORITY_INTERACTIVE,)) for _ in range(40)]
+        threads.append(threading.Thread(target=worker, args=(sb.PRIORITY_BULK,)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = sum(counts.values())
+        self.assertGreater(total, 0)
+        self.assertGreaterEqual(counts[sb.PRIORITY_BULK] / total, 0.15, counts)
+
+
+if __name__ == "__main__":
+    unittest.main()